@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
-import tkinter as tk
-import customtkinter as ctk
-from src.client.gui import FileClientGUI
 
 def main():
+    # Import the GUI here so that importing this module stays cheap;
+    # customtkinter pulls in Tk, its themes and PIL
+    import customtkinter as ctk
+    from src.client.gui import FileClientGUI
+    
     # Create the root window
     root = ctk.CTk()
     
@@ -2,7 +2,7 @@
 import argparse
 import os
 import sys
-from src.server.server import FileServer
+from src.server.server import FileServer, configure_logging, stop_logging
 
 def main():
     # Parse command-line arguments
@@ -10,11 +10,17 @@ def main():
     parser.add_argument("--host", default="0.0.0.0", help="Host address to bind to (default: 0.0.0.0)")
     parser.add_argument("--port", type=int, default=9000, help="Port to listen on (default: 9000)")
     parser.add_argument("--storage", default="storage", help="Directory to store files (default: storage)")
+    parser.add_argument("--workers", type=int, default=64, help="Most requests handled at once (default: 64)")
+    parser.add_argument("--processes", type=int, default=1, help="Processes accepting connections, Linux/BSD only (default: 1)")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds before a stalled client is dropped (default: 60)")
     
     args = parser.parse_args()
     
+    # Log from a background thread, not from the request handlers
+    configure_logging()
+    
     # Create and start the server
-    server = FileServer(args.host, args.port, args.storage)
+    server = FileServer(args.host, args.port, args.storage, args.workers, args.processes, args.timeout)
     
     try:
         print("Starting server...")
@@ -23,6 +29,7 @@ def main():
         print("\nShutting down server...")
     finally:
         server.stop()
+        stop_logging()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,211 @@
+import asyncio
+import os
+
+from ..common import protocol
+
+class AsyncFileClient:
+    def __init__(self, host, port, max_connections=4):
+        """
+        Initialize the asyncio file client.
+        
+        Unlike FileClient, which moves one file at a time over a single
+        socket, this client downloads several files concurrently over
+        separate connections.
+        
+        Args:
+            host: Server host address
+            port: Server port
+            max_connections: Upper bound on parallel connections; every
+                transfer in progress holds one of the server's request
+                workers, so keep this small
+        """
+        self.host = host
+        self.port = port
+        self.max_connections = max(1, max_connections)
+        self.download_dir = os.path.join(os.path.expanduser('~'), 'Downloads')
+        self.timeout = 30  # Connect/receive timeout in seconds
+        self.chunk_size = protocol.DEFAULT_CHUNK_SIZE  # Transfer chunk size in bytes
+    
+    async def download_files(self, filenames, progress_callback=None):
+        """
+        Download several files concurrently.
+        
+        Up to max_connections workers each open their own connection and
+        take filenames from a shared queue until it is empty.
+        
+        Args:
+            filenames: Names of the files to download
+            progress_callback: Optional callback taking (filename, progress)
+        
+        Returns:
+            dict: Mapping of filename to a (success, message) tuple
+        """
+        queue = asyncio.Queue()
+        for filename in filenames:
+            queue.put_nowait(filename)
+        
+        results = {}
+        workers = min(self.max_connections, queue.qsize())
+        await asyncio.gather(*(
+            self._download_worker(queue, results, progress_callback)
+            for _ in range(workers)
+        ))
+        
+        # Anything left over was never picked up because connections failed
+        for filename in filenames:
+            results.setdefault(filename, (False, "Could not connect to server"))
+        
+        return results
+    
+    async def _download_worker(self, queue, results, progress_callback):
+        """
+        Download files from the queue over one connection until it is empty.
+        
+        Args:
+            queue: asyncio.Queue of filenames
+            results: Dict to store (success, message) results in
+            progress_callback: Optional callback taking (filename, progress)
+        """
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port),
+                self.timeout
+            )
+        except Exception as e:
+            print(f"Error connecting to server: {e}")
+            return
+        
+        try:
+            # Check the server speaks this client's protocol before relying on it
+            protocol.send_hello(writer)
+            await writer.drain()
+            protocol.check_hello(*await asyncio.wait_for(protocol.receive_message_async(reader), self.timeout))
+        except Exception as e:
+            print(f"Error connecting to server: {e}")
+            writer.close()
+            return
+        
+        try:
+            while not queue.empty():
+                filename = queue.get_nowait()
+                
+                def report(progress, filename=filename):
+                    if progress_callback:
+                        progress_callback(filename, progress)
+                
+                try:
+                    results[filename] = await self._download_file(reader, writer, filename, report)
+                except (ConnectionError, asyncio.TimeoutError) as e:
+                    # The stream is out of sync or gone; leave the rest of the
+                    # queue to the other workers
+                    results[filename] = (False, f"Error downloading file: {e}")
+                    return
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+    
+    async def _download_file(self, reader, writer, filename, progress_callback):
+        """
+        Download one file over an open connection.
+        
+        Args:
+            reader: asyncio StreamReader of the connection
+            writer: asyncio StreamWriter of the connection
+            filename: Name of the file to download
+            progress_callback: Callback function for progress updates
+        
+        Returns:
+            tuple: (success, message)
+        
+        Raises:
+            ConnectionError: If the connection is lost or out of sync
+        """
+        protocol.send_file_request(writer, filename, self.chunk_size)
+        await writer.drain()
+        
+        msg_type, payload = await asyncio.wait_for(protocol.receive_message_async(reader), self.timeout)
+        
+        if msg_type == protocol.ERROR_MESSAGE:
+            return False, f"Server error: {payload.get('error', 'Unknown error')}"
+        if msg_type != protocol.FILE_RESPONSE:
+            raise ConnectionError("Unexpected response from server")
+        
+        file_size = payload.get('file_size', 0)
+        total_chunks = payload.get('chunks', 0)
+        chunk_size = payload.get('chunk_size', protocol.MAX_CHUNK_SIZE)
+        save_path = os.path.join(self.download_dir, os.path.basename(payload.get('filename', filename)))
+        
+        # File I/O is blocking, so hand it to a worker thread. A file that
+        # can't be saved fails this download only; its chunks are still
+        # read so the connection stays in step for the next one
+        save_error = None
+        try:
+            await asyncio.to_thread(os.makedirs, self.download_dir, exist_ok=True)
+            output_file = await asyncio.to_thread(open, save_path, 'wb')
+        except OSError as e:
+            save_error, output_file = e, None
+        try:
+            received_chunks = 0
+            while received_chunks < total_chunks:
+                msg_type, chunk_payload = await asyncio.wait_for(protocol.receive_message_async(reader), self.timeout)
+                
+                if msg_type == protocol.FILE_CHUNK_BINARY:
+                    # Chunks arrive in order on the stream, so just append
+                    data = chunk_payload['data']
+                    if chunk_payload['chunk_id'] * chunk_size + len(data) > file_size:
+                        raise ConnectionError(f"Invalid file chunk received: {chunk_payload['chunk_id']}")
+                    
+                    if output_file is not None:
+                        try:
+                            await asyncio.to_thread(output_file.write, data)
+                        except OSError as e:
+                            save_error = e
+                            await asyncio.to_thread(self._close_quietly, output_file)
+                            output_file = None
+                    received_chunks += 1
+                    
+                    # Acks are cumulative; the server doesn't wait for them
+                    if received_chunks % 64 == 0 or received_chunks == total_chunks:
+                        protocol.send_chunk_ack(writer, chunk_payload['chunk_id'])
+                        await writer.drain()
+                    
+                    progress_callback(received_chunks / total_chunks * 100)
+                
+                elif msg_type == protocol.ERROR_MESSAGE:
+                    return False, f"Server error: {chunk_payload.get('error', 'Unknown error during transfer')}"
+                
+                elif msg_type is None:
+                    raise ConnectionError("Connection lost during file transfer")
+                
+                else:
+                    raise ConnectionError(f"Unexpected message during file transfer: {msg_type}")
+            
+            msg_type, _ = await asyncio.wait_for(protocol.receive_message_async(reader), self.timeout)
+            if msg_type != protocol.FILE_TRANSFER_COMPLETE:
+                raise ConnectionError("File transfer did not complete properly")
+        finally:
+            if output_file is not None:
+                try:
+                    await asyncio.to_thread(output_file.close)
+                except OSError as e:
+                    save_error = save_error or e
+        
+        if save_error is not None:
+            return False, f"Error saving file: {save_error}"
+        return True, f"File saved to {save_path}"
+    
+    @staticmethod
+    def _close_quietly(file):
+        """
+        Close a file that already failed, ignoring a second error.
+        
+        Args:
+            file: File object to close
+        """
+        try:
+            file.close()
+        except OSError:
+            pass
@@ -1,12 +1,16 @@
+import logging
+import mmap
+import select
 import socket
-import base64
 import os
-import sys
-from pathlib import Path
+import threading
+from collections import deque
 
-# Add parent directory to path for importing common module
-sys.path.append(str(Path(__file__).resolve().parent.parent))
-from common import protocol
+from ..common import protocol
+
+__all__ = ['FileClient']
+
+log = logging.getLogger(__name__)
 
 class FileClient:
     def __init__(self):
@@ -14,40 +18,131 @@ class FileClient:
         Initialize the file client.
         """
         self.socket = None
+        self.rfile = None
+        self.wfile = None
         self.connected = False
         self.download_dir = os.path.join(os.path.expanduser('~'), 'Downloads')
         self.timeout = 30  # Socket timeout in seconds
+        self.chunk_size = protocol.DEFAULT_CHUNK_SIZE  # Transfer chunk size in bytes
+        self.range_size = 16 * 1024 * 1024  # Bytes fetched per range request
+        self.download_connections = 4  # Connections a large download is spread over
+        
+        # Server address and buffer sizes, for the extra download connections
+        self.host = None
+        self.port = None
+        self._buffer_sizes = (protocol.SOCKET_BUFFER_SIZE, protocol.SOCKET_BUFFER_SIZE)
+        
+        # Idle extra download connections, kept open for the next download
+        self._idle_sockets = []
+        self._idle_lock = threading.Lock()
+        
+        # Reusable receive buffer for the download path
+        self._recv_mv = memoryview(bytearray(1 << 20))
         
-        # Create download directory if it doesn't exist
-        os.makedirs(self.download_dir, exist_ok=True)
+        # Listing request in flight, shared by concurrent get_file_list callers
+        self._list_lock = threading.Lock()
+        self._list_request = None
+        
+        # Whether a listing request was sent whose reply hasn't been read yet
+        self._list_pipelined = False
     
-    def connect(self, host, port):
+    def connect(self, host, port, rcvbuf=protocol.SOCKET_BUFFER_SIZE, sndbuf=protocol.SOCKET_BUFFER_SIZE, prefetch_list=False):
         """
         Connect to the file server.
         
         Args:
             host: Server host address
             port: Server port
+            rcvbuf: Requested socket receive buffer size in bytes
+            sndbuf: Requested socket send buffer size in bytes
+            prefetch_list: Send a listing request right away; the next
+                get_file_list reads its reply instead of waiting a round trip
             
         Returns:
             bool: True if connection successful, False otherwise
         """
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(self.timeout)
-            self.socket.connect((host, port))
+            self.socket = self._open_socket(host, port, rcvbuf, sndbuf)
+            self.host, self.port = host, port
+            self._buffer_sizes = (rcvbuf, sndbuf)
+            
+            # The kernel may cap the buffer sizes (e.g. net.core.rmem_max on Linux)
+            granted_rcvbuf = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+            granted_sndbuf = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+            log.debug("Socket buffers: receive %d bytes, send %d bytes", granted_rcvbuf, granted_sndbuf)
+            
+            # Buffered streams coalesce the many small reads and writes of
+            # the message framing into fewer, larger syscalls
+            self.rfile = self.socket.makefile('rb', buffering=1 << 20)
+            self.wfile = self.socket.makefile('wb', buffering=1 << 20)
             self.connected = True
+            
+            # The server answers requests in order, so the listing can be
+            # in flight while the handshake reply is awaited
+            protocol.send_hello(self.wfile)
+            self._list_pipelined = False
+            if prefetch_list:
+                protocol.send_file_list_request(self.wfile)
+                self._list_pipelined = True
+            
+            protocol.check_hello(*protocol.receive_message(self.rfile))
             return True
         except Exception as e:
             print(f"Error connecting to server: {e}")
+            self.disconnect()
             self.connected = False
             return False
     
+    def _open_socket(self, host, port, rcvbuf, sndbuf):
+        """
+        Open a connected socket to the server.
+        
+        Args:
+            host: Server host address
+            port: Server port
+            rcvbuf: Requested socket receive buffer size in bytes
+            sndbuf: Requested socket send buffer size in bytes
+            
+        Returns:
+            socket.socket: The connected socket
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            # Disable Nagle so small acks aren't delayed, and size the buffers
+            # before connecting so the TCP window can scale to match
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+            
+            # Probe idle connections so a dead server or NAT entry is noticed
+            # instead of hanging the next request
+            protocol.enable_keepalive(sock)
+            
+            sock.settimeout(self.timeout)
+            sock.connect((host, port))
+        except:
+            sock.close()
+            raise
+        return sock
+    
     def disconnect(self):
         """
         Disconnect from the server.
         """
         if self.socket and self.connected:
+            for stream in (self.rfile, self.wfile):
+                try:
+                    stream.close()
+                except:
+                    pass
+            self.rfile = None
+            self.wfile = None
+            
+            with self._idle_lock:
+                idle_sockets, self._idle_sockets = self._idle_sockets, []
+            for sock in idle_sockets:
+                sock.close()
+            
             try:
                 self.socket.close()
             except:
@@ -58,6 +153,35 @@ class FileClient:
         """
         Get the list of available files from the server.
         
+        Callers that arrive while a listing request is in flight wait for
+        it and share its result instead of sending another one.
+        
+        Returns:
+            list: List of file information dictionaries
+        """
+        with self._list_lock:
+            request = self._list_request
+            leader = request is None
+            if leader:
+                request = self._list_request = {'done': threading.Event(), 'files': []}
+        
+        if not leader:
+            request['done'].wait()
+            return request['files']
+        
+        try:
+            request['files'] = self._fetch_file_list()
+        finally:
+            with self._list_lock:
+                self._list_request = None
+            request['done'].set()
+        
+        return request['files']
+    
+    def _fetch_file_list(self):
+        """
+        Request the list of available files from the server.
+        
         Returns:
             list: List of file information dictionaries
         """
@@ -65,29 +189,48 @@ class FileClient:
             return []
         
         try:
-            # Send file list request
-            protocol.send_file_list_request(self.socket)
+            # Send file list request, unless one was pipelined at connect
+            if self._list_pipelined:
+                self._list_pipelined = False
+            else:
+                protocol.send_file_list_request(self.wfile)
             
             # Receive response
-            msg_type, payload = protocol.receive_message(self.socket)
+            msg_type, payload = protocol.receive_message(self.rfile)
             
             if msg_type == protocol.FILE_LIST_RESPONSE:
                 return payload.get('files', [])
             elif msg_type == protocol.ERROR_MESSAGE:
                 print(f"Server error: {payload.get('error', 'Unknown error')}")
             else:
+                # A timeout or a reply to something else; a late listing
+                # would be taken for the answer to the next request
                 print(f"Unexpected response: {msg_type}")
+                self.disconnect()
         
         except Exception as e:
             print(f"Error getting file list: {e}")
-            self.connected = False
+            self.disconnect()
         
         return []
     
+    def _collect_pipelined(self):
+        """
+        Read the reply to a listing request pipelined at connect, so it
+        isn't taken for the reply to the next request.
+        """
+        if self._list_pipelined:
+            self.get_file_list()
+    
     def download_file(self, filename, custom_path=None, progress_callback=None):
         """
         Download a file from the server.
         
+        The file is fetched in ranges of range_size bytes. The first range
+        comes over this connection; the rest are spread over it and up to
+        download_connections - 1 extra connections, which write into the
+        file at their offsets in parallel.
+        
         Args:
             filename: Name of the file to download
             custom_path: Custom path to save the file to
@@ -98,131 +241,422 @@ class FileClient:
         """
         if not self.connected:
             return False, "Not connected to server"
+        self._collect_pipelined()
         
         try:
-            # Send file request
-            protocol.send_file_request(self.socket, filename)
+            # Request the first range; its response tells the file size
+            protocol.send_file_range_request(self.wfile, filename, 0, self.range_size, self.chunk_size)
             
             # Receive initial response with file metadata
-            msg_type, payload = protocol.receive_message(self.socket)
+            msg_type, payload = protocol.receive_message(self.rfile, into=self._recv_mv)
             
             if msg_type == protocol.FILE_RESPONSE:
+                # Until the whole reply to the first range is read, the
+                # connection is out of step with the server
+                in_sync = False
                 try:
                     # Extract file metadata
                     received_filename = payload.get('filename', '')
                     file_size = payload.get('file_size', 0)
                     total_chunks = payload.get('chunks', 0)
                     
-                    if not received_filename or total_chunks <= 0:
+                    if not received_filename or file_size < 0 or (total_chunks <= 0 and file_size > 0):
                         return False, "Invalid file metadata received"
                     
-                    # Determine where to save the file
-                    save_path = custom_path if custom_path else os.path.join(self.download_dir, received_filename)
+                    # Determine where to save the file, creating the download
+                    # directory on first use
+                    if custom_path:
+                        save_path = custom_path
+                    else:
+                        os.makedirs(self.download_dir, exist_ok=True)
+                        save_path = os.path.join(self.download_dir, received_filename)
                     
-                    # Open the file for writing
-                    with open(save_path, 'wb') as output_file:
-                        received_chunks = 0
-                        
-                        # Receive chunks until all are received or transfer fails
-                        while received_chunks < total_chunks:
-                            msg_type, chunk_payload = protocol.receive_message(self.socket)
+                    if file_size == 0:
+                        # An empty file has no chunks and nothing to map
+                        msg_type, _ = protocol.receive_message(self.rfile, into=self._recv_mv)
+                        if msg_type != protocol.FILE_TRANSFER_COMPLETE:
+                            return False, "File transfer did not complete properly"
+                        in_sync = True
+                        open(save_path, 'wb').close()
+                        return True, f"File saved to {save_path}"
+                    
+                    # Allocate the file up front and map it, so each chunk is
+                    # received straight into the page cache at its offset
+                    chunk_size = payload.get('chunk_size', protocol.MAX_CHUNK_SIZE)
+                    with open(save_path, 'w+b') as output_file:
+                        self._preallocate(output_file.fileno(), file_size)
+                        with mmap.mmap(output_file.fileno(), file_size) as output_map, \
+                                memoryview(output_map) as map_view:
                             
-                            if msg_type == protocol.FILE_CHUNK:
-                                try:
-                                    # Process chunk data safely
-                                    chunk_id = chunk_payload.get('chunk_id', -1)
-                                    chunk_data = chunk_payload.get('data', '')
-                                    
-                                    if chunk_data:
-                                        # Decode and write chunk data
-                                        try:
-                                            decoded_data = base64.b64decode(chunk_data)
-                                            output_file.write(decoded_data)
-                                            
-                                            # Send acknowledgment
-                                            protocol.send_chunk_ack(self.socket, chunk_id)
-                                            
-                                            # Update progress
-                                            received_chunks += 1
-                                            if progress_callback:
-                                                progress = received_chunks / total_chunks * 100
-                                                progress_callback(progress)
-                                        except Exception as e:
-                                            print(f"Error processing chunk data: {e}")
-                                            return False, f"Error processing file data: {e}"
-                                except Exception as e:
-                                    print(f"Error with chunk payload: {e}")
-                                    return False, f"Error with file chunk: {e}"
-                                
-                            elif msg_type == protocol.ERROR_MESSAGE:
-                                error_msg = chunk_payload.get('error', 'Unknown error during transfer')
-                                return False, f"Server error: {error_msg}"
+                            # Ranges after the first, taken by whichever
+                            # connection is free (deque pops are thread-safe)
+                            ranges = deque(
+                                (offset, min(self.range_size, file_size - offset))
+                                for offset in range(self.range_size, file_size, self.range_size)
+                            )
                             
-                            elif msg_type == protocol.FILE_TRANSFER_COMPLETE:
-                                # Transfer complete
-                                break
+                            # Progress is counted in bytes across all connections
+                            progress_lock = threading.Lock()
+                            received = [0]
                             
-                            elif msg_type is None:
-                                # Connection lost
-                                return False, "Connection lost during file transfer"
-                        
-                        # Wait for final transfer complete message if not already received
-                        if msg_type != protocol.FILE_TRANSFER_COMPLETE:
-                            msg_type, final_payload = protocol.receive_message(self.socket)
-                            if msg_type != protocol.FILE_TRANSFER_COMPLETE:
-                                return False, "File transfer did not complete properly"
+                            def report(length):
+                                with progress_lock:
+                                    received[0] += length
+                                    done = received[0]
+                                if progress_callback:
+                                    progress_callback(done / file_size * 100)
+                            
+                            errors = []
+                            workers = [
+                                threading.Thread(
+                                    target=self._range_worker,
+                                    args=(received_filename, map_view, file_size, ranges, report, errors),
+                                    daemon=True
+                                )
+                                for _ in range(min(self.download_connections - 1, len(ranges)))
+                            ]
+                            for worker in workers:
+                                worker.start()
+                            
+                            try:
+                                # The first range is already on its way
+                                success, message = self._receive_range(
+                                    self.rfile, self._recv_mv, map_view, 0, total_chunks, chunk_size, file_size, report
+                                )
+                                
+                                # Then help with the remaining ranges
+                                while success and not errors and ranges:
+                                    try:
+                                        offset, length = ranges.popleft()
+                                    except IndexError:
+                                        break
+                                    success, message = self._fetch_range(
+                                        self.rfile, self.wfile, self._recv_mv, received_filename,
+                                        map_view, offset, length, file_size, report
+                                    )
+                            finally:
+                                if not success:
+                                    ranges.clear()
+                                # The map can only be closed once no connection writes to it
+                                for worker in workers:
+                                    worker.join()
+                            
+                            # A range that failed on this connection can
+                            # leave the rest of its reply unread
+                            in_sync = success
+                            if not success:
+                                return False, message
+                            if errors:
+                                return False, errors[0]
                     
                     return True, f"File saved to {save_path}"
                 
                 except Exception as e:
                     print(f"Error in file download process: {e}")
                     return False, f"Download failed: {e}"
+                
+                finally:
+                    if not in_sync:
+                        # Its next reply would be taken for the next request's
+                        self.disconnect()
             
             elif msg_type == protocol.ERROR_MESSAGE:
                 error_msg = payload.get('error', 'Unknown error')
                 return False, f"Server error: {error_msg}"
             
             else:
+                # Whatever the server is sending isn't the reply to this request
+                self.disconnect()
                 return False, "Unexpected response from server"
         
         except socket.timeout:
-            self.connected = False
+            self.disconnect()
             return False, "Connection timed out during file download"
         
         except Exception as e:
             print(f"Error downloading file: {e}")
-            self.connected = False
+            self.disconnect()
             return False, f"Error downloading file: {e}"
     
-    def upload_file(self, file_path):
+    def _range_worker(self, filename, map_view, file_size, ranges, report, errors):
+        """
+        Fetch ranges of a download over an extra connection until none are left.
+        
+        Args:
+            filename: Name of the file being downloaded
+            map_view: Writable memoryview of the mapped output file
+            file_size: Size of the file in bytes
+            ranges: Deque of (offset, length) ranges still to fetch
+            report: Callback taking the number of bytes received
+            errors: List to append an error message to on failure
+        """
+        try:
+            sock = self._acquire_socket()
+        except Exception as e:
+            # The other connections fetch the ranges instead
+            print(f"Could not open extra download connection: {e}")
+            return
+        
+        in_sync = False
+        try:
+            # Every message but the chunk data is received into this buffer
+            recv_mv = memoryview(bytearray(1 << 16))
+            while not errors:
+                try:
+                    offset, length = ranges.popleft()
+                except IndexError:
+                    break
+                success, message = self._fetch_range(sock, sock, recv_mv, filename, map_view, offset, length, file_size, report)
+                if not success:
+                    errors.append(message)
+                    ranges.clear()
+                    return
+            
+            # Only a connection that finished its last request cleanly is reused
+            in_sync = True
+        finally:
+            if in_sync:
+                self._release_socket(sock)
+            else:
+                sock.close()
+    
+    def _acquire_socket(self):
+        """
+        Take an idle extra download connection, or open a new one.
+        
+        Returns:
+            socket.socket: A connected socket with no data pending
+        """
+        while True:
+            with self._idle_lock:
+                if not self._idle_sockets:
+                    break
+                sock = self._idle_sockets.pop()
+            
+            # An idle connection has nothing to read unless the server closed it
+            try:
+                readable, _, _ = select.select([sock], [], [], 0)
+            except (OSError, ValueError):
+                readable = True
+            if not readable:
+                return sock
+            sock.close()
+        
+        sock = self._open_socket(self.host, self.port, *self._buffer_sizes)
+        try:
+            # Every connection checks the version, not just the main one
+            protocol.send_hello(sock)
+            protocol.check_hello(*protocol.receive_message(sock))
+        except:
+            sock.close()
+            raise
+        return sock
+    
+    def _release_socket(self, sock):
+        """
+        Keep an extra download connection open for the next download.
+        
+        Args:
+            sock: Socket that finished its last request in sync
+        """
+        with self._idle_lock:
+            if self.connected and len(self._idle_sockets) < self.download_connections - 1:
+                self._idle_sockets.append(sock)
+                return
+        sock.close()
+    
+    def _fetch_range(self, rfile, wfile, recv_mv, filename, map_view, offset, length, file_size, report):
+        """
+        Request one range of a file and receive it into the mapped output file.
+        
+        Args:
+            rfile: Socket or stream to receive from
+            wfile: Socket or stream to send the request on
+            recv_mv: Reusable receive buffer for the connection
+            filename: Name of the file being downloaded
+            map_view: Writable memoryview of the mapped output file
+            offset: Offset of the range in the file
+            length: Length of the range in bytes
+            file_size: Size of the file in bytes
+            report: Callback taking the number of bytes received
+            
+        Returns:
+            tuple: (success, message)
+        """
+        try:
+            protocol.send_file_range_request(wfile, filename, offset, length, self.chunk_size)
+            msg_type, payload = protocol.receive_message(rfile, into=recv_mv)
+        except Exception as e:
+            return False, f"Error requesting file range: {e}"
+        
+        if msg_type == protocol.ERROR_MESSAGE:
+            return False, f"Server error: {payload.get('error', 'Unknown error')}"
+        if msg_type != protocol.FILE_RESPONSE:
+            return False, "Unexpected response from server"
+        if payload.get('file_size') != file_size:
+            return False, f"{filename} changed during download"
+        
+        chunk_size = payload.get('chunk_size', protocol.MAX_CHUNK_SIZE)
+        return self._receive_range(rfile, recv_mv, map_view, offset, payload.get('chunks', 0), chunk_size, file_size, report)
+    
+    @staticmethod
+    def _receive_range(rfile, recv_mv, map_view, range_offset, total_chunks, chunk_size, file_size, report):
+        """
+        Receive the chunks of one range into the mapped output file.
+        
+        Args:
+            rfile: Socket or stream to receive from
+            recv_mv: Reusable receive buffer for the connection
+            map_view: Writable memoryview of the mapped output file
+            range_offset: Offset of the range in the file
+            total_chunks: Number of chunks in the range
+            chunk_size: Chunk size in bytes
+            file_size: Size of the file in bytes
+            report: Callback taking the number of bytes received
+            
+        Returns:
+            tuple: (success, message)
+        """
+        def place(chunk_id, length):
+            # Where a chunk's data goes in the file, None if it doesn't
+            # fit (caught below)
+            offset = range_offset + chunk_id * chunk_size
+            if offset + length > file_size:
+                return None
+            return map_view[offset:offset + length]
+        
+        # Bind what the loop touches per chunk to locals. Range transfers
+        # are bounded by the request, so chunks aren't acknowledged.
+        recv = protocol.receive_message
+        CHUNK = protocol.FILE_CHUNK_BINARY
+        ERR = protocol.ERROR_MESSAGE
+        
+        try:
+            # Receive chunks until all are received or transfer fails
+            received_chunks = 0
+            while received_chunks < total_chunks:
+                msg_type, chunk_payload = recv(rfile, into=recv_mv, sink=place)
+                
+                if msg_type == CHUNK:
+                    # The data was received in place by place()
+                    chunk_id = chunk_payload['chunk_id']
+                    length = len(chunk_payload['data'])
+                    if range_offset + chunk_id * chunk_size + length > file_size:
+                        return False, f"Invalid file chunk received: {chunk_id}"
+                    
+                    received_chunks += 1
+                    report(length)
+                
+                elif msg_type == ERR:
+                    error_msg = chunk_payload.get('error', 'Unknown error during transfer')
+                    return False, f"Server error: {error_msg}"
+                
+                elif msg_type is None:
+                    # Connection lost
+                    return False, "Connection lost during file transfer"
+                
+                else:
+                    return False, "File transfer did not complete properly"
+            
+            # Wait for the transfer complete message
+            msg_type, _ = recv(rfile, into=recv_mv)
+            if msg_type != protocol.FILE_TRANSFER_COMPLETE:
+                return False, "File transfer did not complete properly"
+            
+            return True, ""
+        
+        except Exception as e:
+            print(f"Error with chunk payload: {e}")
+            return False, f"Error with file chunk: {e}"
+    
+    @staticmethod
+    def _preallocate(fd, size):
+        """
+        Reserve disk space for a file so it is laid out contiguously and isn't
+        extended chunk by chunk. Falls back to just setting the size where
+        posix_fallocate is missing or the filesystem doesn't support it.
+        
+        Args:
+            fd: File descriptor opened for writing
+            size: Final file size in bytes
+        """
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                pass
+        os.ftruncate(fd, size)
+    
+    def upload_file(self, file_path, progress_callback=None):
         """
         Upload a file to the server.
         
         Args:
             file_path: Path to the file to upload
+            progress_callback: Optional callback function for progress updates
             
         Returns:
             tuple: (success, message)
         """
         if not self.connected:
             return False, "Not connected to server"
+        self._collect_pipelined()
         
         try:
-            # Check if file exists
-            if not os.path.isfile(file_path):
+            # Opening the file doubles as the existence check
+            try:
+                file = open(file_path, 'rb')
+            except FileNotFoundError:
                 return False, f"File not found: {file_path}"
+            except OSError as e:
+                return False, f"Cannot open {file_path}: {e}"
             
-            # Get the filename and read the file
-            filename = os.path.basename(file_path)
-            
-            with open(file_path, 'rb') as file:
-                file_data = base64.b64encode(file.read()).decode('utf-8')
-            
-            # Send file upload request
-            protocol.send_file_upload_request(self.socket, filename, file_data)
+            with file:
+                filename = os.path.basename(file_path)
+                file_size = os.fstat(file.fileno()).st_size
+                # The server refuses chunks above its limit
+                read_size = min(self.chunk_size, protocol.CHUNK_SIZE_LIMIT)
+                total_chunks = (file_size // read_size) + (1 if file_size % read_size > 0 else 0)
+                
+                # Send upload metadata first
+                protocol.send_file_upload_start(self.wfile, filename, file_size, total_chunks, read_size)
+                
+                # Stream the file in raw binary chunks. Where the OS supports it,
+                # sendfile() moves the data from the page cache to the socket
+                # without copying it through Python
+                use_sendfile = hasattr(os, 'sendfile')
+                if not use_sendfile:
+                    # Otherwise read every chunk into the same buffer
+                    read_view = memoryview(bytearray(read_size))
+                
+                # Cork the socket so headers and data go out as full segments
+                self._set_cork(True)
+                try:
+                    for chunk_id in range(total_chunks):
+                        offset = chunk_id * read_size
+                        count = min(read_size, file_size - offset)
+                        
+                        # The chunks go to the socket itself; wfile holds no
+                        # data as every send flushes it
+                        if use_sendfile:
+                            sent = protocol.send_file_raw(self.socket, chunk_id, file, offset, count)
+                        else:
+                            sent = file.readinto(read_view[:count])
+                            if sent == count:
+                                protocol.send_file_chunk_binary(self.socket, chunk_id, read_view[:count])
+                        
+                        if sent != count:
+                            raise IOError(f"{filename} changed during upload")
+                        
+                        # Update progress
+                        if progress_callback:
+                            progress_callback((chunk_id + 1) / total_chunks * 100)
+                finally:
+                    self._set_cork(False)
             
             # Receive response
-            msg_type, payload = protocol.receive_message(self.socket)
+            msg_type, payload = protocol.receive_message(self.rfile)
             
             if msg_type == protocol.FILE_UPLOAD_RESPONSE:
                 success = payload.get('success', False)
@@ -234,9 +668,21 @@ class FileClient:
                 return False, f"Server error: {error_msg}"
             
             else:
+                # As in download_file, don't reuse a connection out of step
+                self.disconnect()
                 return False, "Unexpected response from server"
         
         except Exception as e:
             print(f"Error uploading file: {e}")
-            self.connected = False
-            return False, f"Error uploading file: {e}"
\ No newline at end of file
+            self.disconnect()
+            return False, f"Error uploading file: {e}"
+    
+    def _set_cork(self, enabled):
+        """
+        Toggle TCP_CORK (Linux) so bulk sends are held back until full segments can go out.
+        
+        Args:
+            enabled: Whether to cork the socket
+        """
+        if hasattr(socket, 'TCP_CORK'):
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1 if enabled else 0)
@@ -1,14 +1,14 @@
 import os
-import sys
-import threading
+import queue
 import time  # Added for the delay
+from concurrent.futures import ThreadPoolExecutor
 import customtkinter as ctk
-from tkinter import filedialog, messagebox, TclError
-from pathlib import Path
+from tkinter import filedialog, messagebox, ttk, TclError
 
-# Add parent directory to path for importing client module
-sys.path.append(str(Path(__file__).resolve().parent.parent))
-from client.client import FileClient
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
+# FileClient's default download directory, shown until the client exists
+_DEFAULT_DOWNLOAD_DIR = os.path.join(os.path.expanduser('~'), 'Downloads')
 
 class FileClientGUI:
     def __init__(self, root):
@@ -19,7 +19,8 @@ class FileClientGUI:
             root: The root window
         """
         self.root = root
-        self.client = FileClient()
+        # Created on first use, see _client()
+        self.client = None
         
         # Set up the GUI
         self.root.title("Secure File Sharing Client")
@@ -29,6 +30,10 @@ class FileClientGUI:
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
         
+        # Fonts are created once and shared by every widget that uses them
+        self._title_font = ctk.CTkFont(family="Arial", size=14, weight="bold")
+        self._header_font = ctk.CTkFont(family="Arial", size=12, weight="bold")
+        
         # Create main frame
         self.main_frame = ctk.CTkFrame(root)
         self.main_frame.pack(fill="both", expand=True, padx=10, pady=10)
@@ -49,6 +54,10 @@ class FileClientGUI:
         self.port_entry.pack(side="left", padx=5)
         self.port_entry.insert(0, "9000")
         
+        # Enter in either field connects
+        self.server_entry.bind("<Return>", self._on_entry_return)
+        self.port_entry.bind("<Return>", self._on_entry_return)
+        
         # Connect button
         self.connect_btn = ctk.CTkButton(
             self.connection_frame,
@@ -61,23 +70,67 @@ class FileClientGUI:
         self.status_label = ctk.CTkLabel(self.connection_frame, text="Not Connected")
         self.status_label.pack(side="left", padx=10)
         
+        # Set while a connection attempt is running
+        self._connecting = False
+        
         # Create file list frame
         self.file_frame = ctk.CTkFrame(self.main_frame)
         self.file_frame.pack(fill="both", expand=True, padx=10, pady=10)
         
         # File list label
-        ctk.CTkLabel(self.file_frame, text="Files on Server:", font=("Arial", 14, "bold")).pack(anchor="w", padx=10, pady=5)
+        ctk.CTkLabel(self.file_frame, text="Files on Server:", font=self._title_font).pack(anchor="w", padx=10, pady=5)
         
         # Create a frame for the file list with scrollbars
         self.file_list_frame = ctk.CTkFrame(self.file_frame)
         self.file_list_frame.pack(fill="both", expand=True, padx=10, pady=5)
         
-        # Create a scrollable frame
-        self.file_list_scrollable = ctk.CTkScrollableFrame(self.file_list_frame)
-        self.file_list_scrollable.pack(fill="both", expand=True)
+        # Loading / empty-list message under the file list
+        self.file_list_status = ctk.CTkLabel(self.file_list_frame, text="")
+        self.file_list_status.pack(side="bottom", pady=5)
+        
+        # Style the file list to match the dark theme
+        style = ttk.Style(self.root)
+        style.theme_use("default")
+        style.configure(
+            "Treeview",
+            background="#2b2b2b",
+            fieldbackground="#2b2b2b",
+            foreground="white",
+            borderwidth=0,
+            rowheight=24
+        )
+        style.map("Treeview", background=[("selected", "#1f538d")])
+        style.configure("Treeview.Heading", background="#3b3b3b", foreground="white", font=self._header_font)
+        
+        # The file list holds one lightweight item per file rather than a
+        # row of widgets
+        file_list_scrollbar = ttk.Scrollbar(self.file_list_frame, orient="vertical")
+        file_list_scrollbar.pack(side="right", fill="y")
+        
+        self.file_tree = ttk.Treeview(
+            self.file_list_frame,
+            columns=("size",),
+            show="tree headings",
+            selectmode="browse",
+            yscrollcommand=file_list_scrollbar.set
+        )
+        self.file_tree.heading("#0", text="File Name", anchor="w")
+        self.file_tree.heading("size", text="Size", anchor="w")
+        self.file_tree.column("#0", width=400, anchor="w")
+        self.file_tree.column("size", width=100, stretch=False, anchor="w")
+        self.file_tree.pack(side="left", fill="both", expand=True)
+        file_list_scrollbar.configure(command=self.file_tree.yview)
+        
+        # Listing currently shown in the file list
+        self._shown_file_list = None
+        
+        # Double-clicking a file downloads it
+        self.file_tree.bind("<Double-1>", self._on_file_double_click)
         
-        # File list (will be populated with CTkFrames for each file)
-        self.file_list_widgets = []
+        # Last listing from the server, reused for a short while
+        self._list_cache = None
+        self._list_cache_ts = 0.0
+        self._refresh_inflight = False
         
         # Create bottom frame for buttons
         self.button_frame = ctk.CTkFrame(self.main_frame)
@@ -101,6 +154,15 @@ class FileClientGUI:
         )
         self.upload_btn.pack(side="left", padx=5)
         
+        # Download button for the selected file
+        self.download_btn = ctk.CTkButton(
+            self.button_frame,
+            text="Download",
+            command=self.download_selected_file,
+            state="disabled"
+        )
+        self.download_btn.pack(side="left", padx=5)
+        
         # Change download dir button
         self.download_dir_btn = ctk.CTkButton(
             self.button_frame,
@@ -112,18 +174,133 @@ class FileClientGUI:
         # Download directory label
         self.download_dir_label = ctk.CTkLabel(
             self.button_frame,
-            text=f"Download Directory: {self.client.download_dir}"
+            text="Download Directory:"
         )
         self.download_dir_label.pack(side="left", padx=5)
+        self._show_download_dir()
         
-        # Keep track of active download dialogs
+        # Keep track of active downloads
         self.active_downloads = {}
+        
+        # One progress dialog, built up front and shown for each transfer
+        self._progress = ctk.CTkToplevel(self.root)
+        self._progress.withdraw()
+        self._progress.geometry("400x150")
+        self._progress.protocol("WM_DELETE_WINDOW", lambda: None)
+        self._progress_active = False
+        
+        self._progress_label = ctk.CTkLabel(self._progress, text="")
+        self._progress_label.pack(pady=(20, 10))
+        
+        # Progress bar
+        self._progress_bar = ctk.CTkProgressBar(self._progress, width=350)
+        self._progress_bar.pack(pady=10)
+        
+        # Status label
+        self._progress_status = ctk.CTkLabel(self._progress, text="")
+        self._progress_status.pack(pady=10)
+        
+        # Cancel button, only shown for downloads
+        self._progress_cancel_btn = ctk.CTkButton(self._progress, text="Cancel")
+        
+        # Progress of the running upload, like the active_downloads entries
+        self._upload_progress = None
+        
+        # Network operations run on a worker pool. All of them share the
+        # client's one socket, so a single worker keeps them in order.
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="file-client")
+        
+        # Workers post (handler, args) here and the main loop runs them
+        self._results = queue.Queue()
+        self._drain_results()
+        
+        # Workers only record their latest progress; it is shown at most
+        # every 50 ms
+        self._drain_progress()
+        
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+    
+    def _post(self, handler, *args):
+        """
+        Queue a UI update from a worker thread.
+        
+        Args:
+            handler: Function to run on the main thread
+            args: Arguments to call it with
+        """
+        self._results.put((handler, args))
+    
+    def _drain_results(self):
+        """
+        Run the UI updates posted by the workers, then reschedule itself.
+        """
+        # Only take what is queued now so a busy worker can't starve the UI.
+        # A handler that raises mustn't stop the updates after it
+        try:
+            for _ in range(self._results.qsize()):
+                try:
+                    handler, args = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                handler(*args)
+        finally:
+            self.root.after(30, self._drain_results)
+    
+    def _drain_progress(self):
+        """
+        Show the latest progress the workers recorded, then reschedule itself.
+        """
+        try:
+            transfers = [("Downloading", info) for info in self.active_downloads.values() if not info["cancelled"]]
+            if self._upload_progress is not None:
+                transfers.append(("Uploading", self._upload_progress))
+            
+            for status, info in transfers:
+                progress = info["pending_progress"]
+                if progress is not None and progress != info["shown_progress"]:
+                    info["shown_progress"] = progress
+                    self._set_progress(status, progress)
+        finally:
+            self.root.after(50, self._drain_progress)
+    
+    def _on_close(self):
+        """
+        Stop the workers and close the window.
+        """
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        # Closing the socket makes a running transfer fail fast
+        if self.client is not None:
+            self.client.disconnect()
+        self.root.destroy()
+    
+    def _client(self):
+        """
+        Get the file client, creating it on first use.
+        
+        Returns:
+            FileClient: The client used for all server operations
+        """
+        if self.client is None:
+            from .client import FileClient
+            self.client = FileClient()
+        return self.client
+    
+    def _show_download_dir(self):
+        """
+        Show the current download directory.
+        """
+        # Without building the client, which imports the network stack
+        download_dir = self.client.download_dir if self.client is not None else _DEFAULT_DOWNLOAD_DIR
+        self.download_dir_label.configure(text=f"Download Directory: {download_dir}")
     
     def toggle_connection(self):
         """
         Toggle connection to the server.
         """
-        if not self.client.connected:
+        if self._connecting:
+            return
+        
+        if not self._client().connected:
             # Connect to server
             host = self.server_entry.get().strip()
             port_str = self.port_entry.get().strip()
@@ -135,27 +312,42 @@ class FileClientGUI:
                 return
             
             # Disable UI during connection attempt
+            self._connecting = True
             self.connect_btn.configure(state="disabled")
             self.status_label.configure(text="Connecting...")
             
-            # Run connection in separate thread to avoid freezing the UI
-            threading.Thread(target=self._connect_thread, args=(host, port), daemon=True).start()
+            # Connect on the worker pool to avoid freezing the UI
+            self._pool.submit(self._connect_thread, host, port)
         else:
             # Disconnect from server
-            self.client.disconnect()
+            self._client().disconnect()
             self.update_connection_state(False)
     
+    def _on_entry_return(self, event):
+        """
+        Connect when Enter is pressed in the server or port field.
+        
+        Args:
+            event: The Tk event
+        """
+        # Enter should never disconnect
+        if not self._client().connected:
+            self.toggle_connection()
+    
     def _connect_thread(self, host, port):
         """
-        Connect to the server in a separate thread.
+        Connect to the server on the worker pool.
         """
-        success = self.client.connect(host, port)
+        try:
+            success = self._client().connect(host, port, prefetch_list=True)
+        finally:
+            self._connecting = False
         
         # Update the UI in the main thread
-        self.root.after(0, lambda: self.update_connection_state(success))
+        self._post(self.update_connection_state, success)
         
         if success:
-            self.root.after(0, self.refresh_file_list)
+            self._post(self.refresh_file_list)
     
     def update_connection_state(self, connected):
         """
@@ -166,105 +358,115 @@ class FileClientGUI:
             self.connect_btn.configure(text="Disconnect", state="normal")
             self.refresh_btn.configure(state="normal")
             self.upload_btn.configure(state="normal")
+            self.download_btn.configure(state="normal")
         else:
             self.status_label.configure(text="Not Connected")
             self.connect_btn.configure(text="Connect", state="normal")
             self.refresh_btn.configure(state="disabled")
             self.upload_btn.configure(state="disabled")
+            self.download_btn.configure(state="disabled")
+            self._list_cache = None
             self.clear_file_list()
     
     def refresh_file_list(self):
         """
         Refresh the file list from the server.
         """
-        if not self.client.connected:
+        if not self._client().connected:
             return
         
-        # Clear current file list
-        self.clear_file_list()
+        # Back-to-back refreshes reuse the last listing
+        if self._list_cache is not None and time.monotonic() - self._list_cache_ts < 2.0:
+            self.update_file_list(self._list_cache)
+            return
+        
+        # A refresh is already on its way
+        if self._refresh_inflight:
+            return
+        self._refresh_inflight = True
         
-        # Show loading indicator
-        loading_label = ctk.CTkLabel(self.file_list_scrollable, text="Loading files...")
-        loading_label.pack(pady=20)
-        self.file_list_widgets.append(loading_label)
+        # Show loading indicator, keeping the current files listed until
+        # the new listing arrives
+        self.file_list_status.configure(text="Loading files...")
         
-        # Get files in separate thread
-        threading.Thread(target=self._refresh_thread, daemon=True).start()
+        # Get files on the worker pool
+        self._pool.submit(self._refresh_thread)
     
     def _refresh_thread(self):
         """
-        Get file list from server in a separate thread.
+        Get file list from server on the worker pool.
         """
-        file_list = self.client.get_file_list()
+        file_list = self._client().get_file_list()
+        
+        self._list_cache = file_list
+        self._list_cache_ts = time.monotonic()
+        self._refresh_inflight = False
         
         # Update the UI in the main thread
-        self.root.after(0, lambda: self.update_file_list(file_list))
+        self._post(self.update_file_list, file_list)
     
     def update_file_list(self, file_list):
         """
         Update the file list UI.
         """
+        # Nothing to redo if the listing hasn't changed
+        if file_list and file_list == self._shown_file_list:
+            self.file_list_status.configure(text="")
+            return
+        
         # Clear the current file list including loading indicator
         self.clear_file_list()
         
         if not file_list:
             # No files found
-            no_files_label = ctk.CTkLabel(
-                self.file_list_scrollable,
-                text="No files found on the server"
-            )
-            no_files_label.pack(pady=20)
-            self.file_list_widgets.append(no_files_label)
+            self.file_list_status.configure(text="No files found on the server")
             return
         
-        # Add header row
-        header_frame = ctk.CTkFrame(self.file_list_scrollable)
-        header_frame.pack(fill="x", pady=5)
-        self.file_list_widgets.append(header_frame)
-        
-        ctk.CTkLabel(header_frame, text="File Name", font=("Arial", 12, "bold"), width=400).pack(side="left", padx=5)
-        ctk.CTkLabel(header_frame, text="Size", font=("Arial", 12, "bold"), width=100).pack(side="left", padx=5)
-        ctk.CTkLabel(header_frame, text="Action", font=("Arial", 12, "bold"), width=100).pack(side="left", padx=5)
-        
-        # Add a separator line
-        separator = ctk.CTkFrame(self.file_list_scrollable, height=1, fg_color="gray")
-        separator.pack(fill="x", pady=5)
-        self.file_list_widgets.append(separator)
-        
-        # Add files
+        # Add files in one burst
+        insert = self.file_tree.insert
         for file_info in file_list:
-            file_frame = ctk.CTkFrame(self.file_list_scrollable)
-            file_frame.pack(fill="x", pady=2)
-            self.file_list_widgets.append(file_frame)
-            
             filename = file_info.get("name", "Unknown")
             size = file_info.get("size_formatted", "Unknown")
             
-            ctk.CTkLabel(file_frame, text=filename, width=400).pack(side="left", padx=5)
-            ctk.CTkLabel(file_frame, text=size, width=100).pack(side="left", padx=5)
-            
-            download_btn = ctk.CTkButton(
-                file_frame,
-                text="Download",
-                width=100,
-                command=lambda fname=filename: self.download_file(fname)
-            )
-            download_btn.pack(side="left", padx=5)
+            insert("", "end", iid=filename, text=filename, values=(size,))
+        
+        self._shown_file_list = file_list
     
     def clear_file_list(self):
         """
         Clear the file list UI.
         """
-        for widget in self.file_list_widgets:
-            widget.destroy()
+        self.file_tree.delete(*self.file_tree.get_children())
+        self.file_list_status.configure(text="")
+        self._shown_file_list = None
+    
+    def download_selected_file(self):
+        """
+        Download the file selected in the file list.
+        """
+        filename = self.file_tree.focus()
+        if not filename:
+            messagebox.showinfo("Info", "Select a file to download")
+            return
         
-        self.file_list_widgets = []
+        self.download_file(filename)
+    
+    def _on_file_double_click(self, event):
+        """
+        Download the file that was double-clicked in the file list.
+        
+        Args:
+            event: The Tk event
+        """
+        filename = self.file_tree.identify_row(event.y)
+        if filename:
+            self.download_file(filename)
     
     def download_file(self, filename):
         """
         Download a file from the server.
         """
-        if not self.client.connected:
+        if not self._client().connected:
             return
         
         # Check if already downloading this file
@@ -272,10 +474,14 @@ class FileClientGUI:
             messagebox.showinfo("Info", f"Already downloading {filename}")
             return
         
+        if self._progress_active:
+            messagebox.showinfo("Info", "Another transfer is in progress")
+            return
+        
         # Create a custom save dialog
         save_path = filedialog.asksaveasfilename(
             title="Save file as",
-            initialdir=self.client.download_dir,
+            initialdir=self._client().download_dir,
             initialfile=filename,
             defaultextension=".*"
         )
@@ -283,57 +489,74 @@ class FileClientGUI:
         if not save_path:
             return  # User cancelled
         
-        # Create progress dialog
-        loading_dialog = ctk.CTkToplevel(self.root)
-        loading_dialog.title(f"Downloading {filename}")
-        loading_dialog.geometry("400x150")
-        loading_dialog.transient(self.root)
-        
-        # Force the dialog to be displayed right away
-        loading_dialog.update()
-        
-        # Add dialog elements
-        ctk.CTkLabel(loading_dialog, text=f"Downloading {filename}...").pack(pady=(20, 10))
-        
-        # Progress bar
-        progress_bar = ctk.CTkProgressBar(loading_dialog, width=350)
-        progress_bar.pack(pady=10)
-        progress_bar.set(0)
-        
-        # Status label
-        status_label = ctk.CTkLabel(loading_dialog, text="Initializing download...")
-        status_label.pack(pady=10)
-        
-        # Cancel button
-        cancel_btn = ctk.CTkButton(
-            loading_dialog,
-            text="Cancel",
-            command=lambda: self._cancel_download(filename)
+        # Show the progress dialog
+        self._show_progress(
+            f"Downloading {filename}",
+            f"Downloading {filename}...",
+            "Initializing download...",
+            lambda: self._cancel_download(filename)
         )
-        cancel_btn.pack(pady=5)
         
         # Add to active downloads
-        self.active_downloads[filename] = {
-            "dialog": loading_dialog,
-            "progress_bar": progress_bar,
-            "status_label": status_label,
-            "cancelled": False
+        download_info = {
+            "cancelled": False,
+            "pending_progress": None,
+            "shown_progress": None
         }
+        self.active_downloads[filename] = download_info
         
-        # Progress callback function
+        # Progress callback function, see _drain_progress
         def update_progress(progress):
-            if filename in self.active_downloads:
-                self.root.after(0, lambda: self._update_download_progress(filename, progress))
+            download_info["pending_progress"] = progress
+        
+        # Start download on the worker pool
+        download_info["future"] = self._pool.submit(self._download_thread, filename, save_path, update_progress)
+    
+    def _show_progress(self, title, text, status, cancel_command=None):
+        """
+        Show the progress dialog for a new transfer.
+        
+        Args:
+            title: Window title
+            text: Description of the transfer
+            status: Initial status text
+            cancel_command: Callback for the Cancel button, or None to hide it
+        """
+        self._progress.title(title)
+        self._progress_label.configure(text=text)
+        self._progress_status.configure(text=status)
+        self._progress_bar.set(0)
+        
+        if cancel_command:
+            self._progress_cancel_btn.configure(command=cancel_command)
+            self._progress_cancel_btn.pack(pady=5)
+        else:
+            self._progress_cancel_btn.pack_forget()
+        
+        self._progress_active = True
+        self._progress.transient(self.root)
+        self._progress.deiconify()
         
         # Try to bring the dialog to front
-        self._safe_grab_set(loading_dialog)
-        
-        # Start download in a separate thread
-        threading.Thread(
-            target=self._download_thread,
-            args=(filename, save_path, update_progress),
-            daemon=True
-        ).start()
+        self._safe_grab_set(self._progress)
+    
+    def _hide_progress(self):
+        """
+        Hide the progress dialog until the next transfer.
+        """
+        self._progress_active = False
+        self._progress.withdraw()
+    
+    def _set_progress(self, status, progress):
+        """
+        Update the progress dialog.
+        
+        Args:
+            status: Status text prefix
+            progress: Progress as a percentage (0-100)
+        """
+        self._progress_bar.set(progress / 100)
+        self._progress_status.configure(text=f"{status}: {progress:.1f}%")
     
     def _safe_grab_set(self, dialog):
         """
@@ -349,24 +572,6 @@ class FileClientGUI:
         except Exception as e:
             print(f"Could not set dialog focus: {e}")
 
-    def _update_download_progress(self, filename, progress):
-        """
-        Update the download progress UI.
-        
-        Args:
-            filename: Name of the file being downloaded
-            progress: Download progress as a percentage (0-100)
-        """
-        if filename not in self.active_downloads:
-            return
-        
-        download_info = self.active_downloads[filename]
-        progress_bar = download_info["progress_bar"]
-        status_label = download_info["status_label"]
-        
-        progress_bar.set(progress / 100)
-        status_label.configure(text=f"Downloading: {progress:.1f}%")
-    
     def _cancel_download(self, filename):
         """
         Cancel an active download.
@@ -375,20 +580,25 @@ class FileClientGUI:
             filename: Name of the file being downloaded
         """
         if filename in self.active_downloads:
-            self.active_downloads[filename]["cancelled"] = True
-            self.active_downloads[filename]["dialog"].destroy()
-            del self.active_downloads[filename]
+            download_info = self.active_downloads[filename]
+            if download_info["future"].cancel():
+                # Still queued behind another operation, so it never starts
+                del self.active_downloads[filename]
+            else:
+                # The entry stays until the worker has cleaned up
+                download_info["cancelled"] = True
+            self._hide_progress()
     
     def _download_thread(self, filename, save_path, progress_callback):
         """
-        Download a file in a separate thread.
+        Download a file on the worker pool.
         
         Args:
             filename: Name of the file to download
             save_path: Path to save the file to
             progress_callback: Callback function for progress updates
         """
-        success, message = self.client.download_file(filename, save_path, progress_callback)
+        success, message = self._client().download_file(filename, save_path, progress_callback)
         
         # Check if download was cancelled
         if filename in self.active_downloads and self.active_downloads[filename]["cancelled"]:
@@ -398,10 +608,11 @@ class FileClientGUI:
                     os.remove(save_path)
             except:
                 pass
+            self._post(self.active_downloads.pop, filename, None)
             return
         
         # Update UI in the main thread
-        self.root.after(0, lambda: self._download_complete(filename, success, message))
+        self._post(self._download_complete, filename, success, message)
     
     def _download_complete(self, filename, success, message):
         """
@@ -413,8 +624,8 @@ class FileClientGUI:
             message: Status message
         """
         if filename in self.active_downloads:
-            self.active_downloads[filename]["dialog"].destroy()
             del self.active_downloads[filename]
+        self._hide_progress()
         
         if success:
             messagebox.showinfo("Success", message)
@@ -422,14 +633,18 @@ class FileClientGUI:
             messagebox.showerror("Error", message)
             
             # If connection was lost, update the UI
-            if not self.client.connected:
+            if not self._client().connected:
                 self.update_connection_state(False)
     
     def upload_file(self):
         """
         Upload a file to the server.
         """
-        if not self.client.connected:
+        if not self._client().connected:
+            return
+        
+        if self._progress_active:
+            messagebox.showinfo("Info", "Another transfer is in progress")
             return
         
         # Open file dialog to select a file
@@ -449,64 +664,61 @@ class FileClientGUI:
             ):
                 return
         
-        # Create a dialog (without custom name since CTkToplevel doesn't support 'name' parameter)
-        loading_dialog = ctk.CTkToplevel(self.root)
-        loading_dialog.title("Uploading...")
-        loading_dialog.geometry("350x100")
-        loading_dialog.transient(self.root)
-        
-        ctk.CTkLabel(loading_dialog, text=f"Uploading {os.path.basename(file_path)}...").pack(pady=20)
-        
-        # Wait for the dialog to be visible before grabbing focus
-        threading.Thread(
-            target=self._safe_grab_set, 
-            args=(loading_dialog,),
-            daemon=True
-        ).start()
-        
-        # Start upload in a separate thread
-        threading.Thread(
-            target=self._upload_thread,
-            args=(file_path, loading_dialog),
-            daemon=True
-        ).start()
+        # Show the progress dialog
+        self._show_progress(
+            "Uploading...",
+            f"Uploading {os.path.basename(file_path)}...",
+            "Initializing upload..."
+        )
+        
+        # Progress is reported on the worker thread, see _drain_progress
+        upload_info = {
+            "pending_progress": None,
+            "shown_progress": None
+        }
+        self._upload_progress = upload_info
+        
+        def update_progress(progress):
+            upload_info["pending_progress"] = progress
+        
+        # Start upload on the worker pool
+        self._pool.submit(self._upload_thread, file_path, update_progress)
     
-    def _upload_thread(self, file_path, loading_dialog):
+    def _upload_thread(self, file_path, progress_callback):
         """
-        Upload a file in a separate thread.
+        Upload a file on the worker pool.
         
         Args:
             file_path: Path to the file to upload
-            loading_dialog: Loading dialog window
+            progress_callback: Callback function for progress updates
         """
-        success, message = self.client.upload_file(file_path)
+        success, message = self._client().upload_file(file_path, progress_callback)
         
         # Update UI in the main thread
-        self.root.after(
-            0,
-            lambda: self._upload_complete(success, message, loading_dialog)
-        )
+        self._post(self._upload_complete, success, message)
     
-    def _upload_complete(self, success, message, loading_dialog):
+    def _upload_complete(self, success, message):
         """
         Handle upload completion.
         
         Args:
             success: Whether the upload was successful
             message: Status message
-            loading_dialog: Loading dialog window
         """
-        loading_dialog.destroy()
+        self._upload_progress = None
+        self._hide_progress()
         
         if success:
             messagebox.showinfo("Success", message)
-            # Refresh file list
-            self.refresh_file_list()
+            # The cached listing is missing the new file
+            self._list_cache_ts = 0.0
+            if self.file_frame.winfo_ismapped():
+                self.refresh_file_list()
         else:
             messagebox.showerror("Error", message)
             
             # If connection was lost, update the UI
-            if not self.client.connected:
+            if not self._client().connected:
                 self.update_connection_state(False)
     
     def change_download_dir(self):
@@ -515,12 +727,12 @@ class FileClientGUI:
         """
         new_dir = filedialog.askdirectory(
             title="Select Download Directory",
-            initialdir=self.client.download_dir
+            initialdir=self._client().download_dir
         )
         
         if new_dir:
-            self.client.download_dir = new_dir
-            self.download_dir_label.configure(text=f"Download Directory: {self.client.download_dir}")
+            self._client().download_dir = new_dir
+            self._show_download_dir()
     
     @staticmethod
     def _format_size(size):
@@ -533,11 +745,10 @@ class FileClientGUI:
         Returns:
             Formatted size string
         """
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size < 1024:
-                return f"{size:.2f} {unit}"
-            size /= 1024
-        return f"{size:.2f} PB"
+        # Every unit is 2**10 of the previous one, so the bit length picks it
+        size = int(size)
+        unit = 0 if size < 1024 else min(len(_SIZE_UNITS) - 1, (size.bit_length() - 1) // 10)
+        return f"{size / (1 << (10 * unit)):.2f} {_SIZE_UNITS[unit]}"
 
 def main():
     root = ctk.CTk()
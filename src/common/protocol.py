@@ -1,7 +1,28 @@
-import json
-import os
+import logging
+import socket
 import struct
-import base64  # Added missing import
+import zlib
+import msgpack
+
+__all__ = [
+    'FILE_LIST_REQUEST', 'FILE_LIST_RESPONSE', 'FILE_REQUEST', 'FILE_RESPONSE',
+    'FILE_UPLOAD_REQUEST', 'FILE_UPLOAD_RESPONSE', 'ERROR_MESSAGE',
+    'FILE_CHUNK_ACK', 'FILE_TRANSFER_COMPLETE', 'FILE_CHUNK_BINARY',
+    'FILE_RANGE_REQUEST', 'HELLO', 'PROTOCOL_VERSION',
+    'HEADER_SIZE', 'CHUNK_ID_SIZE', 'SOCKET_RECV_SIZE', 'SOCKET_BUFFER_SIZE',
+    'MAX_CHUNK_SIZE', 'DEFAULT_CHUNK_SIZE', 'CHUNK_SIZE_LIMIT', 'MAX_PAYLOAD_SIZE',
+    'COMPRESSED_FLAG', 'COMPRESS_THRESHOLD',
+    'create_message', 'send_message', 'send_created_message', 'parse_header',
+    'recv_exactly_into', 'parse_payload', 'receive_message',
+    'receive_message_async',
+    'enable_keepalive', 'check_hello', 'send_hello', 'send_file_list_request',
+    'send_file_list_response', 'send_file_request', 'send_file_range_request',
+    'send_file_response', 'send_file_raw', 'send_file_chunk_binary',
+    'send_chunk_ack', 'send_transfer_complete', 'send_file_upload_start',
+    'send_file_upload_response', 'send_error_message'
+]
+
+log = logging.getLogger(__name__)
 
 # Message types
 FILE_LIST_REQUEST = 1
@@ -11,156 +32,359 @@ FILE_RESPONSE = 4
 FILE_UPLOAD_REQUEST = 5
 FILE_UPLOAD_RESPONSE = 6
 ERROR_MESSAGE = 7
-FILE_CHUNK = 8
+# 8 was FILE_CHUNK, base64-encoded chunk data; don't reuse it
 FILE_CHUNK_ACK = 9
 FILE_TRANSFER_COMPLETE = 10
+FILE_CHUNK_BINARY = 11
+FILE_RANGE_REQUEST = 12
+HELLO = 13
+
+# Bumped whenever client and server stop understanding each other
+PROTOCOL_VERSION = 2
 
 # Buffer sizes
 HEADER_SIZE = 8
-CHUNK_SIZE = 8192
-MAX_CHUNK_SIZE = 65536
+CHUNK_ID_SIZE = 4
+SOCKET_RECV_SIZE = 1 << 20  # Most bytes asked of the socket in one receive call
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024  # Kernel send/receive buffer size to request
+MAX_CHUNK_SIZE = 65536  # Download chunk size when the client doesn't ask for one
+DEFAULT_CHUNK_SIZE = 256 * 1024  # Chunk size clients ask for and upload in
+CHUNK_SIZE_LIMIT = 4 * 1024 * 1024  # Largest chunk size a server will agree to
+# Largest payload a peer may announce; anything bigger is refused before it is received
+MAX_PAYLOAD_SIZE = CHUNK_SIZE_LIMIT + HEADER_SIZE + CHUNK_ID_SIZE
+
+# Frame header: message type and payload length, compiled once
+_HDR = struct.Struct('!II')
+# Chunk id in front of the data of a binary chunk
+_CHUNK_ID = struct.Struct('!I')
+# Frame header and chunk id of a binary chunk or an ack, packed together
+_CHUNK_HDR = struct.Struct('!III')
+
+# Tells send() more data follows (Linux), where the platform has it
+_MSG_MORE = getattr(socket, 'MSG_MORE', 0)
+
+# Set in the message type of a header when the payload is zlib-compressed
+COMPRESSED_FLAG = 0x80000000
+COMPRESS_THRESHOLD = 1024  # Serialized control payloads larger than this are compressed
 
 def create_message(msg_type, payload):
-    """Create a message with header and payload"""
+    """Create a message as a (header, serialized payload) pair"""
     if isinstance(payload, dict):
-        serialized_payload = json.dumps(payload).encode('utf-8')
+        serialized_payload = msgpack.packb(payload, use_bin_type=True)
+        # Large control payloads (e.g. long file lists) compress well
+        if len(serialized_payload) > COMPRESS_THRESHOLD:
+            serialized_payload = zlib.compress(serialized_payload, 1)
+            msg_type |= COMPRESSED_FLAG
     else:
         serialized_payload = payload
-    header = struct.pack('!II', msg_type, len(serialized_payload))
-    return header + serialized_payload
+    header = _HDR.pack(msg_type, len(serialized_payload))
+    return header, serialized_payload
+
+def send_message(sock, msg_type, payload):
+    """Send a message, gathering header and payload without joining them"""
+    header, serialized_payload = create_message(msg_type, payload)
+    _send(sock, header, serialized_payload)
+
+def send_created_message(sock, message):
+    """Send a (header, serialized payload) pair from create_message, e.g. a cached one"""
+    _send(sock, *message)
 
 def parse_header(header_bytes):
     """Parse the header to get message type and payload length"""
-    return struct.unpack('!II', header_bytes)
+    return _HDR.unpack(header_bytes)
+
+def _check_payload_length(payload_length):
+    """Refuse a payload length no message of the protocol can have"""
+    if payload_length > MAX_PAYLOAD_SIZE:
+        raise ValueError(f"payload length {payload_length} exceeds {MAX_PAYLOAD_SIZE}")
+
+def _decompress(payload_bytes):
+    """Inflate a compressed payload, refusing one that would grow beyond MAX_PAYLOAD_SIZE"""
+    decompressor = zlib.decompressobj()
+    data = decompressor.decompress(payload_bytes, MAX_PAYLOAD_SIZE)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"decompressed payload exceeds {MAX_PAYLOAD_SIZE}")
+    if not decompressor.eof:
+        # Output stopped at the limit with more still to come, or the stream is cut short
+        raise ValueError("compressed payload is too large or truncated")
+    return data
+
+def _send(sock, *parts):
+    """
+    Send the parts of a message on a socket, or write and flush them on a
+    binary file-like object. An asyncio StreamWriter only buffers the data;
+    await its drain() after sending.
+    """
+    if len(parts) > 1 and hasattr(sock, 'sendmsg'):
+        # Gather the parts in the kernel instead of joining them here
+        _sendmsg_all(sock, parts)
+    elif hasattr(sock, 'sendall'):
+        sock.sendall(parts[0] if len(parts) == 1 else b''.join(parts))
+    else:
+        for part in parts:
+            sock.write(part)
+        if hasattr(sock, 'flush'):
+            sock.flush()
+
+def _sendmsg_all(sock, parts):
+    """Send every byte of the parts with sendmsg, resuming after partial sends"""
+    views = [memoryview(part).cast('B') for part in parts]
+    while views:
+        sent = sock.sendmsg(views)
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if sent:
+            views[0] = views[0][sent:]
 
-def receive_message(sock):
-    """Receive a complete message from the socket"""
-    # Receive the header first
+def _recv(sock, size):
+    """Receive up to size bytes from a socket or a binary file-like object"""
+    if hasattr(sock, 'recv'):
+        return sock.recv(size)
+    return sock.read(size)
+
+def recv_exactly_into(sock, view):
+    """Fill a writable memoryview from a socket or binary file-like object, False if it closed first"""
+    read_into = sock.recv_into if hasattr(sock, 'recv_into') else sock.readinto
+    received = 0
+    while received < len(view):
+        count = read_into(view[received:received + SOCKET_RECV_SIZE])
+        if not count:
+            return False
+        received += count
+    return True
+
+def parse_payload(msg_type, payload_bytes):
+    """Parse a received payload based on its message type"""
+    if msg_type in [FILE_LIST_REQUEST, FILE_LIST_RESPONSE, FILE_REQUEST, 
+                   FILE_RANGE_REQUEST, FILE_UPLOAD_RESPONSE, ERROR_MESSAGE,
+                   FILE_TRANSFER_COMPLETE, HELLO]:
+        # These should be msgpack maps
+        try:
+            return msgpack.unpackb(payload_bytes, raw=False)
+        except:
+            # If decoding fails, return an empty dict
+            return {}
+    
+    elif msg_type == FILE_CHUNK_ACK:
+        # Just the chunk id
+        if len(payload_bytes) != CHUNK_ID_SIZE:
+            return {"chunk_id": 0}
+        chunk_id, = _CHUNK_ID.unpack_from(payload_bytes)
+        return {"chunk_id": chunk_id}
+    
+    elif msg_type == FILE_CHUNK_BINARY:
+        # Raw file data behind the chunk id, no decoding needed
+        if len(payload_bytes) < CHUNK_ID_SIZE:
+            return {"chunk_id": 0, "data": b""}
+        chunk_id, = _CHUNK_ID.unpack_from(payload_bytes)
+        return {"chunk_id": chunk_id, "data": memoryview(payload_bytes)[CHUNK_ID_SIZE:]}
+    
+    elif msg_type == FILE_UPLOAD_REQUEST:
+        # Upload metadata, the file data follows as file chunk messages
+        try:
+            return msgpack.unpackb(payload_bytes, raw=False)
+        except:
+            return {"filename": "", "file_size": 0, "chunks": 0}
+    
+    elif msg_type == FILE_RESPONSE:
+        # File response metadata
+        try:
+            return msgpack.unpackb(payload_bytes, raw=False)
+        except:
+            return {"filename": "", "file_size": 0, "chunks": 0}
+    
+    else:
+        # For unknown types, just return the raw bytes
+        return payload_bytes
+
+def receive_message(sock, into=None, sink=None):
+    """
+    Receive a complete message from the socket (or a buffered file-like
+    object wrapping one, e.g. from sock.makefile('rb'))
+    
+    If into is given (a writable memoryview), the header and payload are read
+    into it instead of into freshly allocated bytes. Payloads that don't fit
+    are received normally. Raw payloads of unknown types and the data of
+    binary file chunks are then returned as a slice of into, which is only
+    valid until the next call.
+    
+    If sink is given, it is called as sink(chunk_id, length) for every binary
+    file chunk and may return a writable memoryview of that length to receive
+    the chunk data into directly. If it returns None the data is received as
+    without a sink.
+    """
     try:
-        header_bytes = sock.recv(HEADER_SIZE)
-        if not header_bytes or len(header_bytes) < HEADER_SIZE:
-            return None, None
-        
-        # Parse the header
-        msg_type, payload_length = parse_header(header_bytes)
-        
-        # Receive the payload
-        payload_bytes = b''
-        remaining = payload_length
-        
-        while remaining > 0:
-            chunk = sock.recv(min(remaining, CHUNK_SIZE))
-            if not chunk:
+        if into is not None:
+            # Receive and parse the header in place
+            if not recv_exactly_into(sock, into[:HEADER_SIZE]):
+                return None, None
+            msg_type, payload_length = _HDR.unpack_from(into)
+        else:
+            # Receive the header first
+            header_bytes = _recv(sock, HEADER_SIZE)
+            if not header_bytes or len(header_bytes) < HEADER_SIZE:
                 return None, None
-            payload_bytes += chunk
-            remaining -= len(chunk)
+            
+            # Parse the header
+            msg_type, payload_length = parse_header(header_bytes)
+        _check_payload_length(payload_length)
         
-        # Parse the payload based on message type
-        if msg_type in [FILE_LIST_REQUEST, FILE_LIST_RESPONSE, FILE_REQUEST, 
-                       FILE_UPLOAD_RESPONSE, ERROR_MESSAGE,
-                       FILE_CHUNK_ACK, FILE_TRANSFER_COMPLETE]:
-            # These should be JSON
-            try:
-                return msg_type, json.loads(payload_bytes.decode('utf-8'))
-            except:
-                # If JSON parsing fails, return an empty dict
-                return msg_type, {}
+        compressed = msg_type & COMPRESSED_FLAG
+        msg_type &= ~COMPRESSED_FLAG
         
-        elif msg_type == FILE_CHUNK:
-            # Special handling for file chunks
-            try:
-                # Try to decode as JSON first
-                payload = json.loads(payload_bytes.decode('utf-8'))
-                return msg_type, payload
-            except:
-                # If it fails, it's probably binary data - create a safe dict
-                return msg_type, {"chunk_id": 0, "total_chunks": 1, "data": ""}
+        if sink is not None and msg_type == FILE_CHUNK_BINARY and not compressed and payload_length >= CHUNK_ID_SIZE:
+            # Read the chunk id, then let the sink say where the data goes
+            id_view = (into if into is not None else memoryview(bytearray(CHUNK_ID_SIZE)))[:CHUNK_ID_SIZE]
+            if not recv_exactly_into(sock, id_view):
+                return None, None
+            chunk_id, = _CHUNK_ID.unpack_from(id_view)
+            
+            data_length = payload_length - CHUNK_ID_SIZE
+            target = sink(chunk_id, data_length)
+            if target is None:
+                if into is not None and data_length <= len(into):
+                    target = into[:data_length]
+                else:
+                    target = memoryview(bytearray(data_length))
+            
+            if not recv_exactly_into(sock, target):
+                return None, None
+            return msg_type, {"chunk_id": chunk_id, "data": target}
         
-        elif msg_type == FILE_UPLOAD_REQUEST:
-            # Special handling for file uploads which might have binary data
-            try:
-                return msg_type, json.loads(payload_bytes.decode('utf-8'))
-            except:
-                return msg_type, {"filename": "", "file_data": ""}
+        if into is not None and payload_length <= len(into):
+            # Receive the payload into the caller's buffer
+            payload_bytes = into[:payload_length]
+            if not recv_exactly_into(sock, payload_bytes):
+                return None, None
+        else:
+            # Receive the payload in place into a buffer of the final size
+            payload_bytes = bytearray(payload_length)
+            if not recv_exactly_into(sock, memoryview(payload_bytes)):
+                return None, None
         
-        elif msg_type == FILE_RESPONSE:
-            # File response metadata
-            try:
-                return msg_type, json.loads(payload_bytes.decode('utf-8'))
-            except:
-                return msg_type, {"filename": "", "file_size": 0, "chunks": 0}
+        if compressed:
+            payload_bytes = _decompress(payload_bytes)
         
-        else:
-            # For unknown types, just return the raw bytes
-            return msg_type, payload_bytes
-            
+        return msg_type, parse_payload(msg_type, payload_bytes)
+    
+    except Exception as e:
+        log.warning("Error in receive_message: %s", e)
+        return None, None
+
+async def receive_message_async(reader):
+    """Receive a complete message from an asyncio StreamReader"""
+    try:
+        header_bytes = await reader.readexactly(HEADER_SIZE)
+        msg_type, payload_length = parse_header(header_bytes)
+        _check_payload_length(payload_length)
+        payload_bytes = await reader.readexactly(payload_length)
+        if msg_type & COMPRESSED_FLAG:
+            msg_type &= ~COMPRESSED_FLAG
+            payload_bytes = _decompress(payload_bytes)
+        return msg_type, parse_payload(msg_type, payload_bytes)
+    
+    except EOFError:
+        # asyncio.IncompleteReadError: the connection closed mid-message
+        return None, None
+    
     except Exception as e:
-        print(f"Error in receive_message: {e}")
+        log.warning("Error in receive_message_async: %s", e)
         return None, None
 
+def enable_keepalive(sock, idle=60, interval=10, count=5):
+    """Turn on TCP keepalive probes, tuned where the platform allows it"""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for option, value in (('TCP_KEEPIDLE', idle), ('TCP_KEEPINTVL', interval), ('TCP_KEEPCNT', count)):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+def check_hello(msg_type, payload):
+    """Check the reply to send_hello; raises ConnectionError unless the peer speaks PROTOCOL_VERSION"""
+    if msg_type != HELLO:
+        raise ConnectionError("Server did not answer the protocol handshake")
+    version = payload.get('version')
+    if version != PROTOCOL_VERSION:
+        raise ConnectionError(f"Server speaks protocol version {version}, this client {PROTOCOL_VERSION}")
+
 # Message sending functions
+def send_hello(sock):
+    """Send the protocol version this side speaks"""
+    send_message(sock, HELLO, {'version': PROTOCOL_VERSION})
+
 def send_file_list_request(sock):
     """Send a request to get the list of files from the server"""
-    message = create_message(FILE_LIST_REQUEST, {})
-    sock.sendall(message)
+    send_message(sock, FILE_LIST_REQUEST, {})
 
 def send_file_list_response(sock, file_list):
     """Send the list of files to the client"""
-    message = create_message(FILE_LIST_RESPONSE, {'files': file_list})
-    sock.sendall(message)
-
-def send_file_request(sock, filename):
-    """Send a request to download a file from the server"""
-    message = create_message(FILE_REQUEST, {'filename': filename})
-    sock.sendall(message)
-
-def send_file_response(sock, filename, file_size):
-    """Send file metadata as a response to a download request"""
-    total_chunks = (file_size // MAX_CHUNK_SIZE) + (1 if file_size % MAX_CHUNK_SIZE > 0 else 0)
-    message = create_message(FILE_RESPONSE, {
+    send_message(sock, FILE_LIST_RESPONSE, {'files': file_list})
+
+def send_file_request(sock, filename, chunk_size=None):
+    """Send a request to download a file from the server, optionally asking for a chunk size"""
+    request = {'filename': filename}
+    if chunk_size:
+        request['chunk_size'] = chunk_size
+    send_message(sock, FILE_REQUEST, request)
+
+def send_file_range_request(sock, filename, offset, length, chunk_size=None):
+    """Send a request to download length bytes of a file from offset; the file beyond its end is not sent"""
+    request = {'filename': filename, 'offset': offset, 'length': length}
+    if chunk_size:
+        request['chunk_size'] = chunk_size
+    send_message(sock, FILE_RANGE_REQUEST, request)
+
+def send_file_response(sock, filename, file_size, chunk_size=MAX_CHUNK_SIZE, length=None):
+    """Send file metadata as a response to a download request; for a range request, length is the size of the range"""
+    if length is None:
+        length = file_size
+    total_chunks = (length // chunk_size) + (1 if length % chunk_size > 0 else 0)
+    send_message(sock, FILE_RESPONSE, {
         'filename': filename,
         'file_size': file_size,
-        'chunks': total_chunks
+        'chunks': total_chunks,
+        'chunk_size': chunk_size
     })
-    sock.sendall(message)
 
-def send_file_chunk(sock, chunk_id, total_chunks, data):
-    """Send a chunk of file data"""
-    # Ensure data is properly encoded as string if it's binary
-    if isinstance(data, bytes):
-        data = base64.b64encode(data).decode('utf-8')
-        
-    message = create_message(FILE_CHUNK, {
-        'chunk_id': chunk_id,
-        'total_chunks': total_chunks,
-        'data': data
-    })
-    sock.sendall(message)
+def send_file_raw(sock, chunk_id, file, offset, count):
+    """Send count bytes of an open file at offset as a binary chunk with socket.sendfile; returns the bytes of data sent"""
+    header = _CHUNK_HDR.pack(FILE_CHUNK_BINARY, CHUNK_ID_SIZE + count, chunk_id)
+    # Hold the header back to go out with the data instead of in a
+    # segment of its own, as TCP_NODELAY would send it
+    sock.sendall(header, _MSG_MORE)
+    return sock.sendfile(file, offset, count)
+
+def send_file_chunk_binary(sock, chunk_id, data):
+    """Send a chunk of raw file data, framed as the chunk id followed by the bytes"""
+    header = _CHUNK_HDR.pack(FILE_CHUNK_BINARY, CHUNK_ID_SIZE + len(data), chunk_id)
+    _send(sock, header, data)
 
 def send_chunk_ack(sock, chunk_id):
-    """Send acknowledgment for a received chunk"""
-    message = create_message(FILE_CHUNK_ACK, {'chunk_id': chunk_id})
-    sock.sendall(message)
+    """Send acknowledgment for a received chunk, as a bare 12-byte frame"""
+    _send(sock, _CHUNK_HDR.pack(FILE_CHUNK_ACK, CHUNK_ID_SIZE, chunk_id))
 
 def send_transfer_complete(sock, success, filename=""):
     """Signal that a file transfer is complete"""
-    message = create_message(FILE_TRANSFER_COMPLETE, {
+    send_message(sock, FILE_TRANSFER_COMPLETE, {
         'success': success,
         'filename': filename
     })
-    sock.sendall(message)
 
-def send_file_upload_request(sock, filename, file_data):
-    """Send a request to upload a file to the server"""
-    message = create_message(FILE_UPLOAD_REQUEST, {'filename': filename, 'file_data': file_data})
-    sock.sendall(message)
+def send_file_upload_start(sock, filename, file_size, total_chunks, chunk_size=None):
+    """Send upload metadata; the file data follows as FILE_CHUNK_BINARY messages of at most chunk_size bytes"""
+    request = {
+        'filename': filename,
+        'file_size': file_size,
+        'chunks': total_chunks
+    }
+    if chunk_size:
+        request['chunk_size'] = chunk_size
+    send_message(sock, FILE_UPLOAD_REQUEST, request)
 
 def send_file_upload_response(sock, success, message=""):
     """Send a response after processing a file upload request"""
-    message = create_message(FILE_UPLOAD_RESPONSE, {'success': success, 'message': message})
-    sock.sendall(message)
+    send_message(sock, FILE_UPLOAD_RESPONSE, {'success': success, 'message': message})
 
 def send_error_message(sock, error_msg):
     """Send an error message"""
-    message = create_message(ERROR_MESSAGE, {'error': error_msg})
-    sock.sendall(message)
\ No newline at end of file
+    send_message(sock, ERROR_MESSAGE, {'error': error_msg})
\ No newline at end of file
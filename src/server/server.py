@@ -1,16 +1,71 @@
+import asyncio
+import logging
 import os
+import queue
+import signal
 import socket
-import threading
-import base64
 import sys
-from pathlib import Path
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+
+from ..common import protocol
+
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
 
-# Add parent directory to path for importing common module
-sys.path.append(str(Path(__file__).resolve().parent.parent))
-from common import protocol
+log = logging.getLogger(__name__)
+
+# Queue handler and listener set up by configure_logging
+_log_handler = None
+_log_listener = None
+
+def configure_logging(level=logging.INFO):
+    """
+    Send log records through a queue to a background thread that writes
+    them to stdout, so handler threads never wait on the console.
+    
+    Args:
+        level: Lowest level logged; WARNING leaves only problems
+    """
+    global _log_handler, _log_listener
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter('%(message)s'))
+    
+    _log_handler = QueueHandler(queue.SimpleQueue())
+    _log_listener = QueueListener(_log_handler.queue, stream_handler)
+    
+    root = logging.getLogger()
+    root.addHandler(_log_handler)
+    root.setLevel(level)
+    _log_listener.start()
+
+def stop_logging():
+    """
+    Write out the queued log records and stop the logging thread.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+def _pause_logging():
+    """
+    Stop the logging thread while the process forks. Records logged in
+    the meantime wait in the queue until _resume_logging.
+    """
+    if _log_listener is not None:
+        _log_listener.stop()
+
+def _resume_logging():
+    """
+    Start the logging thread again after _pause_logging, in the parent
+    or in a forked child, which gets a thread of its own.
+    """
+    if _log_listener is not None:
+        _log_listener.start()
 
 class FileServer:
-    def __init__(self, host='0.0.0.0', port=9000, storage_dir='storage'):
+    def __init__(self, host='0.0.0.0', port=9000, storage_dir='storage', max_workers=64, processes=1, timeout=60):
         """
         Initialize the file server.
         
@@ -18,74 +73,229 @@ class FileServer:
             host: Host address to bind to
             port: Port to listen on
             storage_dir: Directory where files are stored
+            max_workers: Most requests handled at once; a transfer holds a
+                worker until it is done, further requests wait for one
+            processes: Number of processes accepting connections on the
+                port, each with its own max_workers (needs SO_REUSEPORT)
+            timeout: Seconds a request may wait on a stalled client before
+                its connection is dropped, so it can't hold a worker forever
         """
         self.host = host
         self.port = port
         self.storage_dir = storage_dir
+        self.max_workers = max_workers
+        self.processes = processes
+        self.timeout = timeout
         self.socket = None
-        self.clients = []
+        # Connected client sockets; only the event loop thread touches it
+        self.clients = set()
+        # Per worker thread state, see handle_request
+        self._worker = threading.local()
         self.running = False
         
+        # Event loop and accept task while serving, for stop()
+        self._loop = None
+        self._accept_task = None
+        # The loop only keeps weak references to tasks
+        self._client_tasks = set()
+        # Pids of the forked worker processes, in the parent
+        self._worker_pids = []
+        
+        # Last file list response as (directory mtime, generation, message).
+        # The mtime catches files added or removed behind the server's back,
+        # the generation uploads that replace a file in place
+        self._listing_cache = None
+        self._listing_generation = 0
+        self._listing_lock = threading.Lock()
+        
         # Create storage directory if it doesn't exist
         os.makedirs(self.storage_dir, exist_ok=True)
+        # Resolved once; every requested path must stay inside it
+        self._storage_root = os.path.realpath(self.storage_dir)
     
     def start(self):
         """
         Start the file server.
         """
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.socket.bind((self.host, self.port))
-            self.socket.listen(5)
+            if self.processes > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+                log.warning("Multiple server processes need fork and SO_REUSEPORT, running one")
+                self.processes = 1
+            
+            # Fork before the event loop exists, and with the logging
+            # thread stopped, so that no other thread is running. Each
+            # worker binds its own socket, and the kernel spreads
+            # connections over them
+            if self.processes > 1:
+                _pause_logging()
+                try:
+                    for _ in range(self.processes - 1):
+                        pid = os.fork()
+                        if pid == 0:
+                            self._run_worker()
+                        self._worker_pids.append(pid)
+                finally:
+                    _resume_logging()
+            
+            self.socket = self._listen()
             self.running = True
             
-            print(f"Server started on {self.host}:{self.port}")
-            print(f"Files will be stored in: {os.path.abspath(self.storage_dir)}")
+            log.info("Server started on %s:%s", self.host, self.port)
+            if self.processes > 1:
+                log.info("Accepting connections in %d processes", self.processes)
+            log.info("Files will be stored in: %s", os.path.abspath(self.storage_dir))
             
-            self.accept_connections()
+            self._run_event_loop()
+        except Exception as e:
+            log.error("Error starting server: %s", e)
+    
+    def _listen(self):
+        """
+        Create the listening socket.
+        
+        Returns:
+            socket.socket: Socket bound to the server address and listening
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.processes > 1:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            # Accepted sockets inherit the buffer sizes, which have to be
+            # set before listening for the TCP window to scale to them
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, protocol.SOCKET_BUFFER_SIZE)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, protocol.SOCKET_BUFFER_SIZE)
+            sock.bind((self.host, self.port))
+            sock.listen(5)
+        except:
+            sock.close()
+            raise
+        return sock
+    
+    def _run_event_loop(self):
+        """
+        Run the accept loop in a new event loop until it ends.
+        """
+        if sys.platform != 'win32':
+            asyncio.run(self.accept_connections())
+            return
+        
+        # Waiting on idle clients needs add_reader, which only selector
+        # event loops have; Windows defaults to a proactor event loop
+        if hasattr(asyncio, 'Runner'):
+            with asyncio.Runner(loop_factory=asyncio.SelectorEventLoop) as runner:
+                runner.run(self.accept_connections())
+        else:
+            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+            asyncio.run(self.accept_connections())
+    
+    def _run_worker(self):
+        """
+        Serve connections in a forked worker process, then exit it.
+        """
+        # Forked while the logging thread was paused
+        _resume_logging()
+        
+        # The parent's stop() ends workers with SIGTERM
+        self._worker_pids = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        try:
+            self.socket = self._listen()
+            self.running = True
+            self._run_event_loop()
+        except KeyboardInterrupt:
+            pass
         except Exception as e:
-            print(f"Error starting server: {e}")
+            log.error("Error in server process %d: %s", os.getpid(), e)
+        finally:
+            stop_logging()
+            os._exit(0)
     
     def stop(self):
         """
         Stop the file server.
         """
         self.running = False
-        if self.socket:
+        
+        loop = self._loop
+        if loop is not None:
+            # The sockets belong to the event loop; ending the accept task
+            # makes asyncio.run cancel the client tasks, which close them
+            try:
+                loop.call_soon_threadsafe(self._accept_task.cancel)
+            except RuntimeError:
+                # The loop has already finished
+                pass
+        elif self.socket:
             self.socket.close()
         
-        for client in self.clients:
+        for pid in self._worker_pids:
             try:
-                client.close()
-            except:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
                 pass
+        for pid in self._worker_pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self._worker_pids = []
         
-        print("Server stopped")
+        log.info("Server stopped")
     
-    def accept_connections(self):
+    async def accept_connections(self):
         """
         Accept incoming client connections.
+        
+        One event loop thread waits on the listening socket and on every
+        idle connection. Requests are handled on worker threads, so a
+        connected client only holds a thread while it has a request in
+        progress.
         """
-        while self.running:
-            try:
-                client_socket, address = self.socket.accept()
-                print(f"New connection from {address[0]}:{address[1]}")
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self._accept_task = asyncio.current_task()
+        self.socket.setblocking(False)
+        
+        # Bound the handler threads however many clients connect. As the
+        # default executor, asyncio.run shuts it down after the client tasks
+        loop.set_default_executor(ThreadPoolExecutor(self.max_workers, thread_name_prefix='FileServer'))
+        
+        try:
+            while self.running:
+                try:
+                    client_socket, address = await loop.sock_accept(self.socket)
+                except asyncio.CancelledError:
+                    # Cancelled by stop(); asyncio.run cancels on Ctrl-C as
+                    # well, and turns that back into KeyboardInterrupt
+                    if self.running:
+                        raise
+                    break
+                except OSError as e:
+                    if self.running:
+                        log.error("Error accepting connection: %s", e)
+                    break
                 
-                # Start a new thread to handle this client
-                client_thread = threading.Thread(
-                    target=self.handle_client,
-                    args=(client_socket, address),
-                    daemon=True
-                )
-                client_thread.start()
-                self.clients.append(client_socket)
-            except Exception as e:
-                if self.running:
-                    print(f"Error accepting connection: {e}")
-                break
+                # The handlers block on the socket in their worker thread,
+                # but not for longer than the timeout
+                client_socket.settimeout(self.timeout)
+                # Don't hold back small control messages (Nagle). The buffer
+                # sizes are inherited from the listening socket
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                # Idle connections cost nothing here, so drop dead peers
+                # instead of watching them forever
+                protocol.enable_keepalive(client_socket)
+                log.info("New connection from %s:%s", address[0], address[1])
+                
+                self.clients.add(client_socket)
+                task = loop.create_task(self.handle_client(client_socket, address))
+                self._client_tasks.add(task)
+                task.add_done_callback(self._client_tasks.discard)
+        finally:
+            self._loop = None
+            self.socket.close()
     
-    def handle_client(self, client_socket, address):
+    async def handle_client(self, client_socket, address):
         """
         Handle communication with a client.
         
@@ -93,46 +303,96 @@ class FileServer:
             client_socket: Socket connected to the client
             address: Client's address
         """
+        loop = asyncio.get_running_loop()
         try:
             while self.running:
-                # Receive a message from the client
-                msg_type, payload = protocol.receive_message(client_socket)
+                # Wait for the next request without holding a thread
+                readable = loop.create_future()
+                loop.add_reader(client_socket, self._set_ready, readable)
+                try:
+                    await readable
+                finally:
+                    loop.remove_reader(client_socket)
                 
-                if msg_type is None:
+                if not await loop.run_in_executor(None, self.handle_request, client_socket):
                     # Connection closed
                     break
-                
-                # Process the message based on its type
-                if msg_type == protocol.FILE_LIST_REQUEST:
-                    self.handle_file_list_request(client_socket)
-                
-                elif msg_type == protocol.FILE_REQUEST:
-                    self.handle_file_request(client_socket, payload)
-                
-                elif msg_type == protocol.FILE_CHUNK_ACK:
-                    # Handle chunk acknowledgment (for future use)
-                    continue
-                
-                elif msg_type == protocol.FILE_UPLOAD_REQUEST:
-                    self.handle_file_upload_request(client_socket, payload)
-                
-                else:
-                    print(f"Received unknown message type: {msg_type}")
         
         except Exception as e:
-            print(f"Error handling client {address}: {e}")
+            log.error("Error handling client %s: %s", address, e)
         
         finally:
             # Clean up
-            if client_socket in self.clients:
-                self.clients.remove(client_socket)
+            self.clients.discard(client_socket)
             
             try:
-                client_socket.close()
-            except:
+                # Wake a worker thread still blocked on the socket
+                client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
                 pass
+            client_socket.close()
             
-            print(f"Connection closed with {address[0]}:{address[1]}")
+            log.info("Connection closed with %s:%s", address[0], address[1])
+    
+    @staticmethod
+    def _set_ready(future):
+        """
+        Resolve the future a client task waits on for its socket.
+        
+        Args:
+            future: Future to resolve, if still pending
+        """
+        if not future.done():
+            future.set_result(None)
+    
+    def handle_request(self, client_socket):
+        """
+        Receive and handle one request from a client.
+        
+        Args:
+            client_socket: Socket connected to the client
+            
+        Returns:
+            bool: False once the client has closed the connection
+        """
+        # Requests are received into a buffer each worker thread reuses,
+        # instead of allocating header and payload for every message
+        recv_mv = getattr(self._worker, 'recv_mv', None)
+        if recv_mv is None:
+            recv_mv = self._worker.recv_mv = memoryview(bytearray(1 << 16))
+        
+        # Receive a message from the client
+        msg_type, payload = protocol.receive_message(client_socket, into=recv_mv)
+        
+        if msg_type is None:
+            return False
+        
+        # Process the message based on its type
+        if msg_type == protocol.HELLO:
+            # Clients that skip the handshake are served all the same
+            protocol.send_hello(client_socket)
+        
+        elif msg_type == protocol.FILE_LIST_REQUEST:
+            self.handle_file_list_request(client_socket)
+        
+        elif msg_type == protocol.FILE_REQUEST:
+            self.handle_file_request(client_socket, payload)
+        
+        elif msg_type == protocol.FILE_RANGE_REQUEST:
+            self.handle_file_range_request(client_socket, payload)
+        
+        elif msg_type == protocol.FILE_CHUNK_ACK:
+            # Acks are cumulative: ack(N) covers every chunk up to N.
+            # Clients only send one every few chunks (for future use)
+            pass
+        
+        elif msg_type == protocol.FILE_UPLOAD_REQUEST:
+            self.handle_file_upload_request(client_socket, payload)
+        
+        else:
+            log.warning("Received unknown message type: %s", msg_type)
+        
+        return True
     
     def handle_file_list_request(self, client_socket):
         """
@@ -142,27 +402,77 @@ class FileServer:
             client_socket: Socket connected to the client
         """
         try:
-            # Get the list of files in the storage directory
+            mtime = os.stat(self.storage_dir).st_mtime_ns
+            generation = self._listing_generation
+            cache = self._listing_cache
+            if cache is not None and cache[0] == mtime and cache[1] == generation:
+                # Nothing changed since the last listing was built
+                protocol.send_created_message(client_socket, cache[2])
+                return
+            
+            # Get the list of files in the storage directory. The entries
+            # know their type from the directory read, so only the size
+            # needs a stat
             file_list = []
-            for filename in os.listdir(self.storage_dir):
-                file_path = os.path.join(self.storage_dir, filename)
-                if os.path.isfile(file_path):
-                    # Add file information
-                    size = os.path.getsize(file_path)
-                    file_list.append({
-                        'name': filename,
-                        'size': size,
-                        'size_formatted': self.format_size(size)
-                    })
+            with os.scandir(self.storage_dir) as entries:
+                for entry in entries:
+                    # Leave out links that can't be downloaded, see storage_path
+                    if entry.is_file() and (not entry.is_symlink() or self.storage_path(entry.name)):
+                        # Add file information
+                        size = entry.stat().st_size
+                        file_list.append({
+                            'name': entry.name,
+                            'size': size,
+                            'size_formatted': self.format_size(size)
+                        })
+            
+            # Build the response once for every client asking until it changes
+            message = protocol.create_message(protocol.FILE_LIST_RESPONSE, {'files': file_list})
+            self._listing_cache = (mtime, generation, message)
             
             # Send the file list to the client
-            protocol.send_file_list_response(client_socket, file_list)
-            print(f"Sent list of {len(file_list)} files to client")
+            protocol.send_created_message(client_socket, message)
+            log.info("Sent list of %d files to client", len(file_list))
         
         except Exception as e:
-            print(f"Error handling file list request: {e}")
+            log.error("Error handling file list request: %s", e)
             protocol.send_error_message(client_socket, str(e))
     
+    def storage_path(self, filename):
+        """
+        Map a requested filename to its path in the storage directory.
+        
+        Only plain names of entries directly in the storage directory are
+        accepted, and a symlink there must not lead out of it.
+        
+        Args:
+            filename: Filename from a client request
+            
+        Returns:
+            str: Resolved path of the file, or None if the name is not allowed
+        """
+        if not isinstance(filename, str) or filename in ('', '.', '..') or os.path.basename(filename) != filename:
+            return None
+        
+        path = os.path.realpath(os.path.join(self._storage_root, filename))
+        if os.path.commonpath([path, self._storage_root]) != self._storage_root:
+            return None
+        return path
+    
+    def invalidate_file_list(self):
+        """
+        Make the next file list request rebuild the listing.
+        """
+        with self._listing_lock:
+            self._listing_generation += 1
+        
+        # Other server processes only see the directory mtime
+        if self.processes > 1:
+            try:
+                os.utime(self._storage_root)
+            except OSError:
+                pass
+    
     def handle_file_request(self, client_socket, payload):
         """
         Handle a request to download a file.
@@ -173,81 +483,340 @@ class FileServer:
         """
         try:
             filename = payload.get('filename', '')
-            file_path = os.path.join(self.storage_dir, filename)
+            file_path = self.storage_path(filename)
             
-            if not os.path.isfile(file_path):
+            if file_path is None or not os.path.isfile(file_path):
                 protocol.send_error_message(client_socket, f"File not found: {filename}")
                 return
             
+            chunk_size = self.requested_chunk_size(payload)
+            
             # Get the file size
             file_size = os.path.getsize(file_path)
-            total_chunks = (file_size // protocol.MAX_CHUNK_SIZE) + (1 if file_size % protocol.MAX_CHUNK_SIZE > 0 else 0)
             
             # Send file metadata first
-            protocol.send_file_response(client_socket, filename, file_size)
+            protocol.send_file_response(client_socket, filename, file_size, chunk_size)
             
             # Send the file in chunks
-            with open(file_path, 'rb') as file:
-                chunk_id = 0
-                while True:
-                    data = file.read(protocol.MAX_CHUNK_SIZE)
-                    if not data:
-                        break
-                    
-                    # Encode the chunk data
-                    encoded_data = base64.b64encode(data).decode('utf-8')
-                    
-                    # Send the chunk
-                    protocol.send_file_chunk(client_socket, chunk_id, total_chunks, encoded_data)
-                    
-                    # Wait for acknowledgment (optional for now)
-                    chunk_id += 1
+            total_chunks = self.send_file_chunks(client_socket, file_path, 0, file_size, chunk_size)
             
             # Signal that transfer is complete
             protocol.send_transfer_complete(client_socket, True, filename)
-            print(f"Sent file: {filename} ({self.format_size(file_size)}) in {total_chunks} chunks")
+            log.info("Sent file: %s (%s) in %d chunks", filename, self.format_size(file_size), total_chunks)
         
+        except (ConnectionError, socket.timeout):
+            # Let handle_client drop the connection
+            raise
         except Exception as e:
-            print(f"Error handling file request: {e}")
+            log.error("Error handling file request: %s", e)
             protocol.send_error_message(client_socket, str(e))
     
+    def handle_file_range_request(self, client_socket, payload):
+        """
+        Handle a request to download part of a file.
+        
+        Args:
+            client_socket: Socket connected to the client
+            payload: Message payload containing the filename, offset and length
+        """
+        try:
+            filename = payload.get('filename', '')
+            file_path = self.storage_path(filename)
+            
+            if file_path is None or not os.path.isfile(file_path):
+                protocol.send_error_message(client_socket, f"File not found: {filename}")
+                return
+            
+            chunk_size = self.requested_chunk_size(payload)
+            file_size = os.path.getsize(file_path)
+            
+            offset = payload.get('offset', 0)
+            length = payload.get('length', 0)
+            if not isinstance(offset, int) or not isinstance(length, int) or offset < 0 or length < 0 or offset > file_size:
+                protocol.send_error_message(client_socket, f"Invalid range requested for {filename}")
+                return
+            
+            # The range may run past the end of the file
+            length = min(length, file_size - offset)
+            
+            # Send the metadata of the whole file and the chunk count of the range
+            protocol.send_file_response(client_socket, filename, file_size, chunk_size, length)
+            
+            total_chunks = self.send_file_chunks(client_socket, file_path, offset, length, chunk_size)
+            
+            # Signal that transfer is complete
+            protocol.send_transfer_complete(client_socket, True, filename)
+            log.info("Sent %s of %s from offset %d in %d chunks", self.format_size(length), filename, offset, total_chunks)
+        
+        except (ConnectionError, socket.timeout):
+            # Let handle_client drop the connection
+            raise
+        except Exception as e:
+            log.error("Error handling file range request: %s", e)
+            protocol.send_error_message(client_socket, str(e))
+    
+    @staticmethod
+    def requested_chunk_size(payload):
+        """
+        Get the chunk size a transfer request asked for, within limits.
+        
+        Args:
+            payload: Message payload of the request
+            
+        Returns:
+            int: Chunk size in bytes
+        """
+        chunk_size = payload.get('chunk_size', protocol.MAX_CHUNK_SIZE)
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            chunk_size = protocol.MAX_CHUNK_SIZE
+        return min(chunk_size, protocol.CHUNK_SIZE_LIMIT)
+    
+    @staticmethod
+    def send_file_chunks(client_socket, file_path, offset, length, chunk_size):
+        """
+        Send part of a file as binary chunks numbered from 0.
+        
+        The chunk data goes from the page cache to the socket with
+        sendfile(2) where the platform has it, without passing through
+        Python. Elsewhere every chunk is read into one reused buffer.
+        
+        Args:
+            client_socket: Socket connected to the client
+            file_path: Path of the file to send
+            offset: Where in the file to start
+            length: Number of bytes to send
+            chunk_size: Chunk size in bytes
+            
+        Returns:
+            int: Number of chunks sent
+            
+        Raises:
+            IOError: If the file is shorter than the part to send
+            ConnectionError: If the file shrank while a chunk was being
+                sent; the connection is out of sync and has to be closed
+        """
+        with open(file_path, 'rb') as file:
+            if offset + length > os.fstat(file.fileno()).st_size:
+                raise IOError(f"Unexpected end of file: {file_path}")
+            
+            # socket.sendfile's own fallback reads 8 KiB at a time
+            use_sendfile = hasattr(os, 'sendfile')
+            if not use_sendfile:
+                read_view = memoryview(bytearray(min(chunk_size, length)))
+                file.seek(offset)
+            
+            chunk_id = 0
+            remaining = length
+            while remaining > 0:
+                count = min(chunk_size, remaining)
+                
+                # Send the raw chunk
+                if use_sendfile:
+                    sent = protocol.send_file_raw(client_socket, chunk_id, file, offset, count)
+                else:
+                    sent = file.readinto(read_view[:count])
+                    if sent < count:
+                        # Nothing was sent for this chunk yet
+                        raise IOError(f"Unexpected end of file: {file_path}")
+                    protocol.send_file_chunk_binary(client_socket, chunk_id, read_view[:count])
+                if sent < count:
+                    # The header promised count bytes that no longer exist
+                    raise ConnectionError(f"Unexpected end of file: {file_path}")
+                
+                chunk_id += 1
+                offset += count
+                remaining -= count
+        
+        return chunk_id
+    
     def handle_file_upload_request(self, client_socket, payload):
         """
         Handle a request to upload a file.
         
+        The client sends all of the chunks before it reads the answer, so
+        an upload that is turned down or fails reads and drops the chunks
+        still to come. Otherwise they would be taken for new requests.
+        
         Args:
             client_socket: Socket connected to the client
-            payload: Message payload containing the filename and file data
+            payload: Message payload containing the upload metadata
+            
+        Raises:
+            ConnectionError: If the upload data can't be told apart from
+                what follows it; the connection has to be closed
         """
+        total_chunks = payload.get('chunks', 0)
+        if not isinstance(total_chunks, int) or total_chunks < 0:
+            # There's no telling how much upload data follows
+            raise ConnectionError("Invalid chunk count in file upload request")
+        
         try:
             filename = payload.get('filename', '')
-            file_data = payload.get('file_data', '')
             
-            if not filename or not file_data:
-                protocol.send_error_message(client_socket, "Invalid file upload request")
+            if not filename:
+                self.refuse_upload(client_socket, total_chunks, "Invalid file upload request")
                 return
             
             # Ensure the filename is safe
-            filename = os.path.basename(filename)
-            file_path = os.path.join(self.storage_dir, filename)
+            filename = os.path.basename(filename) if isinstance(filename, str) else None
+            file_path = self.storage_path(filename)
+            if file_path is None:
+                self.refuse_upload(client_socket, total_chunks, "Invalid file upload request")
+                return
+            
+            file_size = payload.get('file_size', 0)
+            if not isinstance(file_size, int) or file_size < 0:
+                self.refuse_upload(client_socket, total_chunks, "Invalid file upload request")
+                return
             
-            # Decode and write the file
+            # Chunk N holds the bytes from N * chunk_size on. Unlike a
+            # download, the client has already chosen it, so it can't be capped
+            chunk_size = payload.get('chunk_size')
+            if isinstance(chunk_size, int) and chunk_size > protocol.CHUNK_SIZE_LIMIT:
+                self.refuse_upload(
+                    client_socket, total_chunks,
+                    f"Chunk size {chunk_size} exceeds the server limit of {protocol.CHUNK_SIZE_LIMIT}"
+                )
+                return
+            chunk_size = self.requested_chunk_size(payload)
+            
+            # Every chunk is received into this one buffer
+            recv_mv = memoryview(bytearray(protocol.HEADER_SIZE + protocol.CHUNK_ID_SIZE + chunk_size))
+            
+            # Receive the chunks and write them as they arrive
+            opened = False
+            chunks_read = 0
             try:
-                decoded_data = base64.b64decode(file_data)
-                with open(file_path, 'wb') as file:
-                    file.write(decoded_data)
-                
-                # Send a success response
-                protocol.send_file_upload_response(client_socket, True, f"File {filename} uploaded successfully")
-                print(f"Received file: {filename} ({self.format_size(len(decoded_data))})")
+                received_size = 0
+                fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+                opened = True
+                try:
+                    # Reserve the whole file up front. Each chunk is written at
+                    # the offset its id gives, so they needn't arrive in order
+                    self.preallocate(fd, file_size)
+                    
+                    # Chunk ids seen so far. Distinct chunks can't overlap, so
+                    # with the byte total checked below they cover the file
+                    seen = bytearray(total_chunks)
+                    while chunks_read < total_chunks:
+                        msg_type, chunk_payload = protocol.receive_message(client_socket, into=recv_mv)
+                        
+                        if msg_type != protocol.FILE_CHUNK_BINARY:
+                            raise ConnectionError("File upload did not complete properly")
+                        chunks_read += 1
+                        
+                        chunk_id = chunk_payload.get('chunk_id', 0)
+                        data = chunk_payload.get('data', b'')
+                        offset = chunk_id * chunk_size
+                        if chunk_id >= total_chunks or seen[chunk_id] or len(data) > chunk_size or offset + len(data) > file_size:
+                            raise ValueError(f"Invalid file chunk received: {chunk_id}")
+                        seen[chunk_id] = 1
+                        
+                        self.write_all(fd, data, offset)
+                        received_size += len(data)
+                    
+                    if received_size != file_size:
+                        raise ValueError(f"Received {received_size} of {file_size} bytes")
+                finally:
+                    os.close(fd)
+                    # Rewriting a file in place doesn't touch the directory mtime
+                    self.invalidate_file_list()
             except Exception as e:
+                # Don't leave a partial file behind, but only one this upload
+                # opened; a file it couldn't open was never touched
+                if opened:
+                    try:
+                        os.remove(file_path)
+                    except OSError:
+                        pass
+                log.error("Error saving uploaded file: %s", e)
+                if isinstance(e, ConnectionError):
+                    raise
+                self.skip_upload_chunks(client_socket, total_chunks - chunks_read, recv_mv)
                 protocol.send_file_upload_response(client_socket, False, f"Error saving file: {str(e)}")
-                print(f"Error saving uploaded file: {e}")
+                return
+            
+            # Send a success response
+            protocol.send_file_upload_response(client_socket, True, f"File {filename} uploaded successfully")
+            log.info("Received file: %s (%s) in %d chunks", filename, self.format_size(received_size), total_chunks)
         
+        except (ConnectionError, socket.timeout):
+            # Let handle_client drop the connection
+            raise
         except Exception as e:
-            print(f"Error handling file upload request: {e}")
+            log.error("Error handling file upload request: %s", e)
             protocol.send_error_message(client_socket, str(e))
     
+    def refuse_upload(self, client_socket, total_chunks, message):
+        """
+        Turn down an upload request, once the chunks the client sends
+        regardless have been read.
+        
+        Args:
+            client_socket: Socket connected to the client
+            total_chunks: Number of chunks the request announced
+            message: Error message for the client
+        """
+        self.skip_upload_chunks(client_socket, total_chunks, self._worker.recv_mv)
+        protocol.send_error_message(client_socket, message)
+    
+    @staticmethod
+    def skip_upload_chunks(client_socket, count, recv_mv):
+        """
+        Read and drop chunks of an upload that won't be saved.
+        
+        Args:
+            client_socket: Socket connected to the client
+            count: Number of chunks still to come
+            recv_mv: Reusable receive buffer
+            
+        Raises:
+            ConnectionError: If the client sends something else or goes away
+        """
+        for _ in range(count):
+            msg_type, _ = protocol.receive_message(client_socket, into=recv_mv)
+            if msg_type != protocol.FILE_CHUNK_BINARY:
+                raise ConnectionError("File upload did not complete properly")
+    
+    @staticmethod
+    def preallocate(fd, size):
+        """
+        Reserve disk space for a file so it is laid out contiguously and isn't
+        extended chunk by chunk. Falls back to just setting the size where
+        posix_fallocate is missing or the filesystem doesn't support it.
+        
+        Args:
+            fd: File descriptor opened for writing
+            size: Final file size in bytes
+        """
+        if hasattr(os, 'posix_fallocate') and size > 0:
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                pass
+        os.ftruncate(fd, size)
+    
+    @staticmethod
+    def write_all(fd, data, offset):
+        """
+        Write all of a buffer to a file descriptor at an offset.
+        
+        Args:
+            fd: File descriptor open for writing
+            data: Bytes-like object to write
+            offset: Position in the file to write at
+        """
+        view = memoryview(data)
+        while view:
+            if hasattr(os, 'pwrite'):
+                written = os.pwrite(fd, view, offset)
+            else:
+                os.lseek(fd, offset, os.SEEK_SET)
+                written = os.write(fd, view)
+            view = view[written:]
+            offset += written
+    
     @staticmethod
     def format_size(size):
         """
@@ -259,20 +828,21 @@ class FileServer:
         Returns:
             Formatted size string
         """
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size < 1024:
-                return f"{size:.2f} {unit}"
-            size /= 1024
-        return f"{size:.2f} PB"
+        # Every unit is 2**10 of the previous one, so the bit length picks it
+        size = int(size)
+        unit = 0 if size < 1024 else min(len(_SIZE_UNITS) - 1, (size.bit_length() - 1) // 10)
+        return f"{size / (1 << (10 * unit)):.2f} {_SIZE_UNITS[unit]}"
 
 def main():
+    configure_logging()
     server = FileServer()
     try:
         server.start()
     except KeyboardInterrupt:
-        print("Shutting down server...")
+        log.info("Shutting down server...")
     finally:
         server.stop()
+        stop_logging()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file